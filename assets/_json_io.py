@@ -0,0 +1,84 @@
+import mmap
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Union
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib parser; same loads/JSONDecodeError API
+    import json as orjson
+
+# The parser the other scripts share, so the fallback lives in one place
+loads = orjson.loads
+JSONDecodeError = orjson.JSONDecodeError
+
+def _iter_lines_mmap(file: BinaryIO, start: int) -> Iterator[bytes]:
+    """Yield the lines of a binary file from byte offset `start`, sliced out of a read-only memory map"""
+    if os.fstat(file.fileno()).st_size <= start:
+        return  # nothing left; an empty file cannot be mapped either
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        find = mm.find
+        pos = start
+        while pos < size:
+            end = find(b'\n', pos)
+            if end < 0:
+                end = size
+            yield mm[pos:end]
+            pos = end + 1
+
+def _iter_lines_buffered(file: BinaryIO, start: int) -> Iterator[bytes]:
+    """Yield the lines of a binary file from byte offset `start` through the regular buffered reader"""
+    file.seek(start)
+    yield from file
+
+def _parse_lines(lines: Iterable[bytes], skip_invalid: bool) -> Iterator[Any]:
+    """Parse each non-blank line as one record; orjson takes the raw bytes, line ending included"""
+    for line in lines:
+        if line.strip():
+            try:
+                item = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                if skip_invalid:
+                    continue
+                raise
+            yield item
+
+def iter_records(path: Union[str, Path], *, use_mmap: bool = True, skip_invalid: bool = True) -> Iterator[Any]:
+    """Yield the records of a JSON or JSON Lines file.
+
+    JSON Lines files are streamed one line at a time; a JSON document is parsed
+    whole and its top-level array (or single value) yielded item by item.
+    Unparseable lines are skipped, or raise JSONDecodeError when
+    `skip_invalid` is false. I/O errors propagate to the caller.
+    """
+    iter_lines = _iter_lines_mmap if use_mmap else _iter_lines_buffered
+    with open(path, 'rb') as file:
+        # Sniff the first non-blank line: an object that parses on its own
+        # means JSON Lines, so the file is never parsed whole just to fail
+        head = file.readline()
+        while head and not head.strip():
+            head = file.readline()
+        if head.lstrip()[:1] == b'{':
+            try:
+                first = orjson.loads(head)
+            except orjson.JSONDecodeError:
+                first = None
+            if first is not None:
+                yield first
+                yield from _parse_lines(iter_lines(file, file.tell()), skip_invalid)
+                return
+
+        # Otherwise try reading as regular JSON
+        file.seek(0)
+        try:
+            content = orjson.loads(file.read())
+        except orjson.JSONDecodeError:
+            # If that fails, stream it as JSONL
+            yield from _parse_lines(iter_lines(file, 0), skip_invalid)
+            return
+
+    if isinstance(content, list):
+        yield from content
+    else:
+        yield content
@@ -1,11 +1,15 @@
-import json
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import os
-from typing import List, Dict, Any
+import sys
+from typing import List, Dict, Any, Tuple
+import numpy as np
 import pandas as pd
 
+from _json_io import loads, JSONDecodeError
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / 'raw_data'
 RECEIPTS_FILE = DATA_DIR / 'receipts.json'
@@ -17,13 +21,23 @@ print("Attempting to open:", os.path.abspath('../raw_data/receipts.json'))
 
 def load_json_lines(file_path: Path) -> List[Dict[Any, Any]]:
     """Load JSON Lines file into a list of dictionaries."""
+    lines = file_path.read_bytes().splitlines()
+    try:
+        return [loads(line) for line in lines if line]
+    except JSONDecodeError:
+        # Only pay for per-line error handling when the file has bad lines
+        return _load_lines_tolerant(lines, file_path.name)
+
+def _load_lines_tolerant(lines: List[bytes], file_name: str) -> List[Dict[Any, Any]]:
+    """Parse lines one by one, reporting and skipping the ones that fail."""
     data = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            try:
-                data.append(json.loads(line.strip()))
-            except json.JSONDecodeError as e:
-                print(f"Error parsing line in {file_path.name}: {e}")
+    for line in lines:
+        if not line:
+            continue
+        try:
+            data.append(loads(line))
+        except JSONDecodeError as e:
+            print(f"Error parsing line in {file_name}: {e}")
     return data
 
 def profile_data_quality(data: List[dict], entity_name: str) -> None:
@@ -38,91 +52,107 @@ def profile_data_quality(data: List[dict], entity_name: str) -> None:
         print("No data to analyze!")
         return
     
+    # Tally non-null values per field, and the distinct values of categorical
+    # fields, in a single pass over the records
+    categorical_fields = {'rewardsReceiptStatus', 'role', 'state', 'category'}
+    non_null_counts = defaultdict(int)
+    unique_values = defaultdict(set)
+    for d in data:
+        for field, value in d.items():
+            if value is not None:
+                non_null_counts[field] += 1
+                if field in categorical_fields:
+                    unique_values[field].add(value)
+    
     # Analyze field completeness
     fields = set().union(*(d.keys() for d in data))
     print("\nField completeness:")
     for field in sorted(fields):
-        non_null_count = sum(1 for d in data if field in d and d[field] is not None)
-        null_count = total_records - non_null_count
+        null_count = total_records - non_null_counts[field]
         null_percentage = (null_count / total_records) * 100
         print(f"  {field}: {null_percentage:.1f}% null ({null_count} records)")
         
         # Sample unique values for categorical fields
-        if field in ['rewardsReceiptStatus', 'role', 'state', 'category']:
-            unique_values = set(d.get(field) for d in data if field in d and d[field] is not None)
-            print(f"    Unique values: {sorted(unique_values)}")
+        if field in categorical_fields:
+            print(f"    Unique values: {sorted(unique_values[field])}")
+
+def parse_mongo_dates(values: List[Any]) -> pd.Series:
+    """Parse MongoDB-style ({'$date': epoch_ms}) and string dates in vectorized passes."""
+    # MongoDB-style dates: milliseconds since epoch, converted in a single call
+    epochs = pd.to_numeric(
+        pd.Series([v.get('$date') if type(v) is dict else None for v in values], dtype=object),
+        errors='coerce'
+    )
+    dates = pd.Series(pd.to_datetime(epochs, unit='ms', errors='coerce'))
+    
+    # Anything given as a string goes through the regular parser, also in one call
+    is_string = pd.Series([type(v) is str for v in values], dtype=bool)
+    if is_string.any():
+        strings = pd.Series(values, dtype=object)[is_string]
+        # Each string may have its own format (as when parsed one by one); parse
+        # as UTC and drop the zone so offset-suffixed ISO strings ('...Z') land
+        # in the same naive datetime64 column as the epoch dates
+        parsed = pd.to_datetime(strings, errors='coerce', utc=True, format='mixed')
+        dates[is_string] = parsed.dt.tz_convert(None)
+    return dates
 
-def analyze_business_questions(receipts: List[dict], users: List[dict], brands: List[dict]) -> None:
+def analyze_business_questions(receipt_df: pd.DataFrame, items_df: pd.DataFrame,
+                               users_df: pd.DataFrame, brands: List[dict],
+                               status_summary: pd.DataFrame) -> None:
     """Analyze data for business questions."""
     print("\n=== Business Questions Analysis ===")
     
-    # Handle date fields that might be dictionaries
-    def safe_parse_date(date_value):
-        if isinstance(date_value, dict):
-            # Handle MongoDB-style dates that contain milliseconds since epoch
-            if '$date' in date_value:
-                try:
-                    # Convert milliseconds to seconds by dividing by 1000
-                    timestamp = date_value['$date'] / 1000
-                    return pd.to_datetime(timestamp, unit='s')
-                except (ValueError, TypeError):
-                    return None
-        try:
-            return pd.to_datetime(date_value)
-        except:
-            return None
-    
-    def get_id(doc):
-        id_value = doc.get('_id')
-        if isinstance(id_value, dict):
-            return str(id_value.get('$oid', id_value))
-        return str(id_value)
+    # Brand lookups by code; the first brand listed for a code wins
+    brand_name_by_code = {}
+    for brand in brands:
+        brand_code = brand.get('brandCode')
+        if brand_code and brand_code not in brand_name_by_code:
+            brand_name_by_code[brand_code] = brand['name']
     
     # 1. Top 5 brands by receipts scanned for most recent month AND previous month comparison
-    receipt_dates = [safe_parse_date(receipt.get('dateScanned')) for receipt in receipts]
-    valid_dates = [d for d in receipt_dates if d is not None]
-    latest_month = max(valid_dates).replace(day=1) if valid_dates else None
-    previous_month = (latest_month - timedelta(days=1)).replace(day=1) if latest_month else None
+    scan_dates = receipt_df['scan_date']
+    latest_date = scan_dates.max() if scan_dates.notna().any() else None
+    latest_month = latest_date.to_period('M') if latest_date is not None else None
+    previous_month = latest_month - 1 if latest_date is not None else None
+    
+    # Month membership for every receipt at once, compared as integer period
+    # ordinals; unparseable dates match neither
+    if latest_month is not None:
+        scan_months = scan_dates.dt.to_period('M').array.asi8
+        in_latest_month = scan_months == latest_month.ordinal
+        in_previous_month = scan_months == previous_month.ordinal
+    else:
+        in_latest_month = in_previous_month = np.zeros(len(scan_dates), dtype=bool)
     
     print("\nDate Range Analysis:")
-    print(f"Latest date in data: {max(valid_dates) if valid_dates else 'No valid dates'}")
+    print(f"Latest date in data: {latest_date if latest_date is not None else 'No valid dates'}")
     print(f"Latest month: {latest_month}")
     print(f"Previous month: {previous_month}")
     
-    current_month_brands = defaultdict(int)
-    previous_month_brands = defaultdict(int)
-    
-    receipt_count = 0
-    brand_code_count = 0
-    
-    for receipt, scan_date in zip(receipts, receipt_dates):
-        if not scan_date:
-            continue
-            
-        scan_month = scan_date.replace(day=1)
-        if scan_month == latest_month:
-            receipt_count += 1
-            for item in receipt.get('rewardsReceiptItemList', []):
-                brand_code = item.get('brandCode')
-                if brand_code:
-                    brand_code_count += 1
-                    current_month_brands[brand_code] += 1
-        elif scan_month == previous_month:
-            for item in receipt.get('rewardsReceiptItemList', []):
-                brand_code = item.get('brandCode')
-                if brand_code:
-                    previous_month_brands[brand_code] += 1
-    
-    print(f"\nReceipts in latest month: {receipt_count}")
-    print(f"Items with brand codes in latest month: {brand_code_count}")
+    # Items inherit the month flags of their receipt
+    item_receipts = items_df['receipt_idx'].to_numpy()
+    item_in_latest = in_latest_month[item_receipts]
+    item_in_previous = in_previous_month[item_receipts]
+    
+    # Dense integer IDs per brand code (sorted, -1 for missing) turn the
+    # per-month tallies into plain bincounts
+    brand_ids, brand_codes = pd.factorize(items_df['brand_code'], sort=True)
+    has_brand = brand_ids >= 0
+    current_counts = np.bincount(brand_ids[has_brand & item_in_latest], minlength=len(brand_codes))
+    previous_counts = np.bincount(brand_ids[has_brand & item_in_previous], minlength=len(brand_codes))
+    current_month_brands = pd.Series(current_counts, index=brand_codes)[current_counts > 0]
+    previous_month_brands = pd.Series(previous_counts, index=brand_codes)
+    
+    print(f"\nReceipts in latest month: {int(in_latest_month.sum())}")
+    print(f"Items with brand codes in latest month: {int(current_month_brands.sum())}")
     print(f"Unique brands in latest month: {len(current_month_brands)}")
-    print(f"Unique brands in previous month: {len(previous_month_brands)}")
+    print(f"Unique brands in previous month: {int((previous_month_brands > 0).sum())}")
     
     print("\n1. Top 5 brands for most recent month:")
-    current_top_5 = sorted(current_month_brands.items(), key=lambda x: x[1], reverse=True)[:5]
+    current_top_5 = list(current_month_brands.nlargest(5).items())
     if current_top_5:
         for brand_code, count in current_top_5:
-            brand_name = next((b['name'] for b in brands if b.get('brandCode') == brand_code), brand_code)
+            brand_name = brand_name_by_code.get(brand_code, brand_code)
             print(f"  {brand_name}: {count} receipts")
     else:
         print("  No brand data available for the most recent month")
@@ -130,117 +160,85 @@ def analyze_business_questions(receipts: List[dict], users: List[dict], brands:
     print("\n2. Month-over-month comparison:")
     if current_top_5:
         for brand_code, current_count in current_top_5:
-            brand_name = next((b['name'] for b in brands if b.get('brandCode') == brand_code), brand_code)
+            brand_name = brand_name_by_code.get(brand_code, brand_code)
             previous_count = previous_month_brands[brand_code]
             change = current_count - previous_count
             print(f"  {brand_name}: Current: {current_count}, Previous: {previous_count}, Change: {change:+d}")
     else:
         print("  No brand data available for comparison")
     
-    # 3. Analysis by receipt status (Accepted/Rejected)
-    status_metrics = defaultdict(lambda: {'spend': 0.0, 'items': 0, 'count': 0})
-    
-    for receipt in receipts:
-        status = receipt.get('rewardsReceiptStatus')
-        if status in ['ACCEPTED', 'REJECTED']:
-            try:
-                spent = float(receipt.get('totalSpent', 0))
-                items = int(receipt.get('purchasedItemCount', 0))
-                status_metrics[status]['spend'] += spent
-                status_metrics[status]['items'] += items
-                status_metrics[status]['count'] += 1
-            except (ValueError, TypeError):
-                continue
-    
+    # 3. Analysis by receipt status (Accepted/Rejected), over receipts with
+    # both a spend and an item count
     print("\n3. Receipt Status Analysis (Accepted vs Rejected):")
-    for status, metrics in status_metrics.items():
-        avg_spend = metrics['spend'] / metrics['count'] if metrics['count'] > 0 else 0
-        avg_items = metrics['items'] / metrics['count'] if metrics['count'] > 0 else 0
-        print(f"  {status}:")
-        print(f"    Average spend: ${avg_spend:.2f}")
-        print(f"    Average items: {avg_items:.1f}")
-        print(f"    Total receipts: {metrics['count']}")
+    for row in status_summary.reindex(['accepted', 'rejected'], fill_value=0).itertuples():
+        if row.complete_count == 0:
+            continue
+        print(f"  {row.Index.upper()}:")
+        print(f"    Average spend: ${row.complete_spent_sum / row.complete_count:.2f}")
+        print(f"    Average items: {row.complete_item_sum / row.complete_count:.1f}")
+        print(f"    Total receipts: {row.complete_count}")
     
     # 4 & 5. Brand analysis for recent users
-    six_months_ago = max(valid_dates) - timedelta(days=180) if valid_dates else None
+    six_months_ago = latest_date - timedelta(days=180) if latest_date is not None else None
     if six_months_ago:
-        # Parse user creation dates first
-        user_creation_dates = {
-            get_id(u): safe_parse_date(u.get('createdDate'))
-            for u in users
-        }
-        
-        recent_user_ids = {
-            user_id
-            for user_id, created_date in user_creation_dates.items()
-            if created_date and created_date >= six_months_ago
-        }
+        is_recent = users_df['created_date'] >= six_months_ago
+        recent_user_ids = frozenset(users_df['user_id'][is_recent].dropna())
         
-        brand_metrics = defaultdict(lambda: {
-            'spend': 0.0, 
-            'transactions': set(),  
-            'total_items': 0,
-            'total_spend': 0.0
-        })
+        # Resolve recent-user membership for all receipts at once, then keep
+        # the branded items with a usable price and quantity
+        is_recent_receipt = receipt_df['user_id'].isin(recent_user_ids).to_numpy()
+        recent_items = items_df[
+            is_recent_receipt[items_df['receipt_idx'].to_numpy()]
+            & items_df['brand_code'].notna().to_numpy()
+            & items_df['final_price_num'].notna().to_numpy()
+            & items_df['quantity_num'].notna().to_numpy()
+        ]
+        quantity = recent_items['quantity_num'].to_numpy().astype('int64')
+        spend = recent_items['final_price_num'].to_numpy(dtype='float64') * quantity
         
-        for receipt in receipts:
-            receipt_user_id = get_id({'_id': receipt.get('userId')})
-            if receipt_user_id in recent_user_ids:
-                receipt_id = get_id(receipt)  
-                for item in receipt.get('rewardsReceiptItemList', []):
-                    brand_code = item.get('brandCode')
-                    if brand_code:
-                        try:
-                            quantity = int(item.get('quantityPurchased', 1))
-                            price = float(item.get('finalPrice', 0))
-                            brand_metrics[brand_code]['total_spend'] += price * quantity
-                            brand_metrics[brand_code]['total_items'] += quantity
-                            brand_metrics[brand_code]['transactions'].add(receipt_id)  
-                        except (ValueError, TypeError):
-                            continue
+        # One row per brand, in order of first appearance; bincount sums in row
+        # order so the totals match a plain running sum
+        brand_idx, brand_codes = pd.factorize(recent_items['brand_code'])
+        receipt_pairs = pd.DataFrame({'brand': brand_idx, 'receipt': recent_items['receipt_idx'].to_numpy()})
+        n_brands = len(brand_codes)
+        brand_results = pd.DataFrame({
+            'total_spend': np.bincount(brand_idx, weights=spend, minlength=n_brands),
+            'total_items': np.bincount(brand_idx, weights=quantity, minlength=n_brands).astype('int64'),
+            'transaction_count': np.bincount(receipt_pairs.drop_duplicates()['brand'], minlength=n_brands),
+        }, index=brand_codes)
+        total_items = brand_results['total_items']
+        brand_results['avg_price_per_item'] = (
+            brand_results['total_spend'].div(total_items.where(total_items > 0)).fillna(0)
+        )
+        is_known_brand = brand_results.index.isin(list(brand_name_by_code))
+        brand_results['brand_name'] = np.where(
+            is_known_brand,
+            brand_results.index.map(brand_name_by_code),
+            'missing_brand_' + brand_results.index.astype(str),
+        )
+        brand_results['brand_status'] = np.where(is_known_brand, "valid brand", "missing from brands table")
         
         print("\n4. Brands with highest spend among recent users (past 6 months):")
-        brand_results = []
-        for brand_code, metrics in brand_metrics.items():
-            brand_name = next((b['name'] for b in brands if b.get('brandCode') == brand_code), 
-                            f"missing_brand_{brand_code}")
-            brand_status = "valid brand" if any(b.get('brandCode') == brand_code for b in brands) else "missing from brands table"
-            
-            avg_price = (metrics['total_spend'] / metrics['total_items'] 
-                       if metrics['total_items'] > 0 else 0)
-            
-            brand_results.append({
-                'brand_name': brand_name,
-                'total_spend': metrics['total_spend'],
-                'total_items': metrics['total_items'],
-                'transaction_count': len(metrics['transactions']),
-                'avg_price_per_item': round(avg_price, 2),
-                'brand_status': brand_status
-            })
-        
-        # Sort by total spend and display top 6
-        sorted_by_spend = sorted(brand_results, key=lambda x: x['total_spend'], reverse=True)[:6]
-        for brand in sorted_by_spend:
-            print(f"\n  {brand['brand_name']}:")
-            print(f"    Total spend: ${brand['total_spend']:.2f}")
-            print(f"    Total items: {brand['total_items']}")
-            print(f"    Transaction count: {brand['transaction_count']}")
-            print(f"    Avg price per item: ${brand['avg_price_per_item']:.2f}")
-            print(f"    Status: {brand['brand_status']}")
+        for brand in brand_results.nlargest(6, 'total_spend').itertuples():
+            print(f"\n  {brand.brand_name}:")
+            print(f"    Total spend: ${brand.total_spend:.2f}")
+            print(f"    Total items: {brand.total_items}")
+            print(f"    Transaction count: {brand.transaction_count}")
+            print(f"    Avg price per item: ${brand.avg_price_per_item:.2f}")
+            print(f"    Status: {brand.brand_status}")
 
         print("\n5. Brands with most transactions among recent users (past 6 months):")
-        sorted_by_transactions = sorted(brand_results, key=lambda x: x['transaction_count'], reverse=True)[:6]
-        for brand in sorted_by_transactions:
-            print(f"\n  {brand['brand_name']}:")
-            print(f"    Transaction count: {brand['transaction_count']}")
-            print(f"    Total spend: ${brand['total_spend']:.2f}")
-            print(f"    Total items: {brand['total_items']}")
-            print(f"    Avg price per item: ${brand['avg_price_per_item']:.2f}")
-            print(f"    Status: {brand['brand_status']}")
+        for brand in brand_results.nlargest(6, 'transaction_count').itertuples():
+            print(f"\n  {brand.brand_name}:")
+            print(f"    Transaction count: {brand.transaction_count}")
+            print(f"    Total spend: ${brand.total_spend:.2f}")
+            print(f"    Total items: {brand.total_items}")
+            print(f"    Avg price per item: ${brand.avg_price_per_item:.2f}")
+            print(f"    Status: {brand.brand_status}")
     else:
         print("  No data available for recent users")
 
-def analyze_brand_codes(receipts: List[dict], brands: List[dict]) -> None:
+def analyze_brand_codes(items_df: pd.DataFrame, brands: List[dict]) -> None:
     """Analyze brand codes in receipts and brands data"""
     print("\n=== Brand Code Analysis ===")
     
@@ -250,18 +248,13 @@ def analyze_brand_codes(receipts: List[dict], brands: List[dict]) -> None:
         if brand.get('brandCode')
     }
     
-
-    brand_codes_from_receipts = set()
-    brand_code_frequency = defaultdict(int)
-    total_items = 0
-    
-    for receipt in receipts:
-        for item in receipt.get('rewardsReceiptItemList', []):
-            total_items += 1
-            brand_code = item.get('brandCode')
-            if brand_code:
-                brand_codes_from_receipts.add(brand_code)
-                brand_code_frequency[brand_code] += 1
+    receipt_brand_codes = items_df['brand_code'].dropna()
+    brand_code_frequency = receipt_brand_codes.value_counts()
+    # unique() keeps first-seen order; the set is only for the comparisons below
+    receipt_brand_order = receipt_brand_codes.unique()
+    brand_codes_from_receipts = set(receipt_brand_order)
+    total_items = len(items_df)
+    items_with_brand_codes = len(receipt_brand_codes)
     
     # Analysis results
     brands_only_in_receipts = brand_codes_from_receipts - set(brand_codes_from_brands.keys())
@@ -272,8 +265,8 @@ def analyze_brand_codes(receipts: List[dict], brands: List[dict]) -> None:
     print(f"Total unique brand codes in brands table: {len(brand_codes_from_brands)}")
     print(f"Total unique brand codes in receipts: {len(brand_codes_from_receipts)}")
     print(f"Total receipt items: {total_items}")
-    print(f"Receipt items with brand codes: {sum(brand_code_frequency.values())}")
-    print(f"Receipt items without brand codes: {total_items - sum(brand_code_frequency.values())}")
+    print(f"Receipt items with brand codes: {items_with_brand_codes}")
+    print(f"Receipt items without brand codes: {total_items - items_with_brand_codes}")
     
     print("\nBrand Code Overlap:")
     print(f"Brand codes in both: {len(brands_in_both)}")
@@ -282,22 +275,23 @@ def analyze_brand_codes(receipts: List[dict], brands: List[dict]) -> None:
     
     # Show top 10 most frequent brand codes in receipts
     print("\nTop 10 most frequent brand codes in receipts:")
-    top_brands = sorted(brand_code_frequency.items(), key=lambda x: x[1], reverse=True)[:10]
-    for brand_code, frequency in top_brands:
+    top_brands = brand_code_frequency.head(10)
+    for brand_code, frequency in top_brands.items():
         brand_name = brand_codes_from_brands.get(brand_code, "NOT IN BRANDS TABLE")
         print(f"  {brand_code} ({brand_name}): {frequency} occurrences")
     
     # Show sample of missing brands
     if brands_only_in_receipts:
         print("\nSample of brand codes in receipts but missing from brands table (up to 10):")
-        sample_missing = list(brands_only_in_receipts)[:10]
+        # In first-seen order, so the sample does not depend on set iteration order
+        sample_missing = [code for code in receipt_brand_order if code in brands_only_in_receipts][:10]
         for brand_code in sample_missing:
             frequency = brand_code_frequency[brand_code]
             print(f"  {brand_code}: {frequency} occurrences")
     
     # Data quality implications
     print("\nData Quality Implications:")
-    missing_brands_items = sum(brand_code_frequency[code] for code in brands_only_in_receipts)
+    missing_brands_items = int(brand_code_frequency[list(brands_only_in_receipts)].sum())
     if missing_brands_items > 0:
         print(f"- {missing_brands_items} receipt items ({(missing_brands_items/total_items*100):.1f}%) " 
               f"reference brand codes that don't exist in the brands table")
@@ -307,111 +301,181 @@ def analyze_brand_codes(receipts: List[dict], brands: List[dict]) -> None:
         print(f"- {unused_brands} brands ({(unused_brands/len(brand_codes_from_brands)*100):.1f}%) " 
               f"in the brands table are never referenced in receipts")
 
-def get_mongo_id(doc: dict) -> str:
-    """Extract ID from MongoDB-style document, handling both string and dict formats."""
-    id_value = doc.get('_id')
-    if isinstance(id_value, dict) and '$oid' in id_value:
-        return id_value['$oid']
-    return str(id_value) if id_value else None
+def _coerce_oid(value: Any) -> str:
+    """Unwrap a MongoDB ObjectId reference ({'$oid': ...}) or stringify a plain ID."""
+    if type(value) is dict and '$oid' in value:
+        return value['$oid']
+    return str(value) if value else None
+
+def _intern(value: Any) -> Any:
+    """Intern strings so repeated codes and IDs share one object; other values pass through."""
+    return sys.intern(value) if type(value) is str else value
+
+def build_receipts_frame(receipts: List[dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Flatten receipts into column-oriented receipt and item frames in a single pass.
+    
+    Item rows point back at their receipt through receipt_idx, the receipt's
+    row position in receipt_df. Raw values are kept as-is next to their parsed
+    forms: scan_date holds dateScanned, and the *_num columns hold the numeric
+    fields coerced with NaN marking values that could not be converted.
+    """
+    receipt_columns = {name: [] for name in
+                       ('_id', 'user_id', 'status', 'total_spent', 'item_count', 'date_scanned')}
+    item_columns = {name: [] for name in ('receipt_idx', 'brand_code', 'final_price', 'quantity')}
+    
+    for receipt_idx, receipt in enumerate(receipts):
+        receipt_columns['_id'].append(_coerce_oid(receipt.get('_id')))
+        receipt_columns['user_id'].append(_intern(_coerce_oid(receipt.get('userId'))))
+        receipt_columns['status'].append(_intern(receipt.get('rewardsReceiptStatus')))
+        # Missing numeric fields default the same way the per-receipt analyses always have
+        receipt_columns['total_spent'].append(receipt.get('totalSpent', 0))
+        receipt_columns['item_count'].append(receipt.get('purchasedItemCount', 0))
+        receipt_columns['date_scanned'].append(receipt.get('dateScanned'))
+        
+        for item in receipt.get('rewardsReceiptItemList', []):
+            item_columns['receipt_idx'].append(receipt_idx)
+            item_columns['brand_code'].append(_intern(item.get('brandCode') or None))
+            item_columns['final_price'].append(item.get('finalPrice', 0))
+            item_columns['quantity'].append(item.get('quantityPurchased', 1))
+    
+    receipt_df = pd.DataFrame(receipt_columns, dtype=object)
+    receipt_df['scan_date'] = parse_mongo_dates(receipt_columns['date_scanned'])
+    receipt_df['total_spent_num'] = pd.to_numeric(receipt_df['total_spent'], errors='coerce')
+    receipt_df['item_count_num'] = pd.to_numeric(receipt_df['item_count'], errors='coerce')
+    items_df = pd.DataFrame(item_columns, dtype=object).astype({'receipt_idx': 'int64'})
+    items_df['final_price_num'] = pd.to_numeric(items_df['final_price'], errors='coerce')
+    items_df['quantity_num'] = _coerce_int_like(items_df['quantity'])
+    return receipt_df, items_df
 
-def analyze_receipt_status(receipts: List[dict], users: List[dict]) -> None:
+def _coerce_int_like(values: pd.Series) -> pd.Series:
+    """Coerce values to numbers the way int() accepts them, NaN where int() would fail.
+    
+    pd.to_numeric alone would take a string such as '2.5', which int() rejects;
+    strings must be whole-number literals. Numbers are kept as-is and truncated
+    by the caller, as int() truncates them.
+    """
+    numbers = pd.to_numeric(values, errors='coerce')
+    is_string = values.map(type).eq(str)
+    if is_string.any():
+        is_literal = values[is_string].str.fullmatch(r'\s*[+-]?\d+\s*')
+        numbers[is_literal.index[~is_literal]] = np.nan
+    return numbers
+
+def build_users_frame(users: List[dict]) -> pd.DataFrame:
+    """Extract user IDs and parsed creation dates once for all analyses."""
+    return pd.DataFrame({
+        'user_id': pd.Series([_intern(_coerce_oid(u.get('_id'))) for u in users], dtype=object),
+        'created_date': parse_mongo_dates([u.get('createdDate') for u in users]),
+    })
+
+def _status_metrics(status_codes: np.ndarray, spent: np.ndarray, items: np.ndarray,
+                    n_statuses: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-status receipt counts, spend sums and item sums, indexed by status code.
+    
+    Each reduction is a single np.bincount over the whole column. NaN spend or
+    item values count towards the receipt total but add nothing to the sums.
+    """
+    counts = np.bincount(status_codes, minlength=n_statuses)
+    spent_sum = np.bincount(status_codes, weights=np.nan_to_num(spent), minlength=n_statuses)
+    item_sum = np.bincount(status_codes, weights=np.nan_to_num(items), minlength=n_statuses)
+    return counts, spent_sum, item_sum
+
+def compute_status_summary(receipt_df: pd.DataFrame, users_df: pd.DataFrame) -> pd.DataFrame:
+    """Per-status receipt metrics shared by the status reports, indexed by lowercased status.
+    
+    The receipt_* figures follow the per-receipt loop they replace: every
+    receipt is counted, but one whose spend does not parse adds nothing else,
+    and one whose item count does not parse adds only its spend; missing users
+    come from receipts where both parse. The complete_* sums cover only
+    receipts with both a spend and an item count.
+    """
+    status_codes, statuses = pd.factorize(receipt_df['status'].fillna('').str.lower())
+    spent = receipt_df['total_spent_num'].to_numpy(dtype='float64')
+    items = receipt_df['item_count_num'].to_numpy(dtype='float64')
+    spent_ok = ~np.isnan(spent)
+    complete = spent_ok & ~np.isnan(items)
+    counts, spent_sum, item_sum = _status_metrics(
+        status_codes, spent, np.where(spent_ok, items, np.nan), len(statuses)
+    )
+    complete_counts, complete_spent, complete_items = _status_metrics(
+        status_codes[complete], spent[complete], items[complete], len(statuses)
+    )
+    
+    user_id = receipt_df['user_id']
+    missing_user = (
+        complete & (user_id.notna() & ~user_id.isin(set(users_df['user_id'].dropna()))).to_numpy()
+    )
+    missing_users = (
+        user_id[missing_user].groupby(status_codes[missing_user]).nunique()
+        .reindex(range(len(statuses)), fill_value=0)
+    )
+    
+    return pd.DataFrame({
+        'receipt_count': counts,
+        'spent_sum': spent_sum,
+        'item_sum': item_sum,
+        'complete_count': complete_counts,
+        'complete_spent_sum': complete_spent,
+        'complete_item_sum': complete_items,
+        'missing_users': missing_users.to_numpy(),
+    }, index=pd.Index(statuses, name='status'))
+
+def analyze_receipt_status(status_summary: pd.DataFrame) -> None:
     """Analyze receipts by status (Accepted/Rejected)"""
     print("\n=== Receipt Status Analysis ===")
     
-    status_metrics = defaultdict(lambda: {
-        'count': 0,
-        'total_spent': 0.0,
-        'total_items': 0,
-        'missing_users': set()
-    })
-    
-    user_ids = {get_mongo_id(u): u for u in users if get_mongo_id(u)}
-    
-    for receipt in receipts:
-        status = receipt.get('rewardsReceiptStatus', '').lower()
-        user_id = get_mongo_id(receipt) 
-        
-        try:
-            status_metrics[status]['count'] += 1
-            status_metrics[status]['total_spent'] += float(receipt.get('totalSpent', 0))
-            status_metrics[status]['total_items'] += int(receipt.get('purchasedItemCount', 0))
-            
-            if user_id and user_id not in user_ids:
-                status_metrics[status]['missing_users'].add(user_id)
-                
-        except (ValueError, TypeError):
-            continue
-    
     print("\nStatus Metrics:")
-    for status, metrics in status_metrics.items():
-        if status in ['accepted', 'rejected']:
-            avg_spend = metrics['total_spent'] / metrics['count'] if metrics['count'] > 0 else 0
-            avg_items = metrics['total_items'] / metrics['count'] if metrics['count'] > 0 else 0
-            print(f"\n{status.upper()}:")
-            print(f"  Receipt count: {metrics['count']}")
+    for row in status_summary.itertuples():
+        if row.Index in ['accepted', 'rejected']:
+            count = row.receipt_count
+            avg_spend = row.spent_sum / count if count > 0 else 0
+            avg_items = row.item_sum / count if count > 0 else 0
+            print(f"\n{row.Index.upper()}:")
+            print(f"  Receipt count: {count}")
             print(f"  Average spend: ${avg_spend:.2f}")
             print(f"  Average items: {avg_items:.1f}")
-            print(f"  Missing users: {len(metrics['missing_users'])}")
+            print(f"  Missing users: {row.missing_users}")
 
-def analyze_data_quality(receipts: List[dict], users: List[dict], brands: List[dict]) -> None:
+def analyze_data_quality(receipt_df: pd.DataFrame, items_df: pd.DataFrame,
+                         users_df: pd.DataFrame, brands: List[dict]) -> None:
     """Comprehensive data quality analysis"""
     print("\n=== Data Quality Analysis ===")
     
-    receipt_issues = defaultdict(int)
-    for receipt in receipts:
-        if not receipt.get('_id'):
-            receipt_issues['missing_receipt_id'] += 1
-        if not receipt.get('userId'):
-            receipt_issues['missing_user_id'] += 1
-        if not receipt.get('dateScanned'):
-            receipt_issues['missing_scan_date'] += 1
-            
-        try:
-            pd.to_datetime(receipt.get('dateScanned'))
-        except:
-            receipt_issues['invalid_scan_date'] += 1
-            
-        try:
-            if float(receipt.get('totalSpent', 0)) < 0:
-                receipt_issues['negative_total_spent'] += 1
-            if int(receipt.get('purchasedItemCount', 0)) < 0:
-                receipt_issues['negative_item_count'] += 1
-        except (ValueError, TypeError):
-            receipt_issues['invalid_numeric_values'] += 1
-            
-        items = receipt.get('rewardsReceiptItemList', [])
-        for item in items:
-            if not item.get('brandCode'):
-                receipt_issues['missing_brand_codes'] += 1
-            try:
-                if float(item.get('finalPrice', 0)) < 0:
-                    receipt_issues['negative_item_prices'] += 1
-            except (ValueError, TypeError):
-                receipt_issues['invalid_item_prices'] += 1
+    receipt_issues = Counter()
+    receipt_issues['missing_receipt_id'] = int(receipt_df['_id'].isna().sum())
+    receipt_issues['missing_user_id'] = int(receipt_df['user_id'].isna().sum())
+    has_scan_date = receipt_df['date_scanned'].astype(bool)
+    receipt_issues['missing_scan_date'] = int((~has_scan_date).sum())
+    receipt_issues['invalid_scan_date'] = int((has_scan_date & receipt_df['scan_date'].isna()).sum())
+    
+    total_spent = receipt_df['total_spent_num']
+    item_count = receipt_df['item_count_num']
+    receipt_issues['negative_total_spent'] = int((total_spent < 0).sum())
+    receipt_issues['negative_item_count'] = int((total_spent.notna() & (item_count < 0)).sum())
+    receipt_issues['invalid_numeric_values'] = int((total_spent.isna() | item_count.isna()).sum())
+    
+    receipt_issues['missing_brand_codes'] = int(items_df['brand_code'].isna().sum())
+    final_price = items_df['final_price_num']
+    receipt_issues['negative_item_prices'] = int((final_price < 0).sum())
+    receipt_issues['invalid_item_prices'] = int(final_price.isna().sum())
     
     print("\nReceipt Quality Issues:")
     for issue, count in receipt_issues.items():
-        print(f"  {issue}: {count}")
+        if count:
+            print(f"  {issue}: {count}")
     
     brand_codes = {b.get('brandCode') for b in brands if b.get('brandCode')}
-    receipt_brand_codes = set()
-    invalid_brand_refs = 0
-    
-    for receipt in receipts:
-        for item in receipt.get('rewardsReceiptItemList', []):
-            brand_code = item.get('brandCode')
-            if brand_code:
-                receipt_brand_codes.add(brand_code)
-                if brand_code not in brand_codes:
-                    invalid_brand_refs += 1
+    item_brand_codes = items_df['brand_code']
+    receipt_brand_codes = set(item_brand_codes.dropna().unique())
+    invalid_brand_refs = int((item_brand_codes.notna() & ~item_brand_codes.isin(brand_codes)).sum())
     
     print("\nBrand Reference Integrity:")
     print(f"  Total unique brands: {len(brand_codes)}")
     print(f"  Brands referenced in receipts: {len(receipt_brand_codes)}")
     print(f"  Invalid brand references: {invalid_brand_refs}")
     
-    user_ids = {get_mongo_id(u) for u in users if get_mongo_id(u)}
-    receipt_user_ids = {get_mongo_id({'_id': r.get('userId')}) for r in receipts if r.get('userId')}
+    user_ids = set(users_df['user_id'].dropna())
+    receipt_user_ids = set(receipt_df['user_id'].dropna())
     invalid_user_refs = len(receipt_user_ids - user_ids)
     
     print("\nUser Reference Integrity:")
@@ -420,39 +484,41 @@ def analyze_data_quality(receipts: List[dict], users: List[dict], brands: List[d
     print(f"  Invalid user references: {invalid_user_refs}")
 
     print("\nAdditional Quality Metrics:")
-    print(f"  Receipts with no items: {sum(1 for r in receipts if not r.get('rewardsReceiptItemList'))}")
+    print(f"  Receipts with no items: {len(receipt_df) - items_df['receipt_idx'].nunique()}")
     print(f"  Users with no receipts: {len(user_ids - receipt_user_ids)}")
     print(f"  Unused brands: {len(brand_codes - receipt_brand_codes)}")
     
-    valid_dates = []
-    for receipt in receipts:
-        try:
-            date = pd.to_datetime(receipt.get('dateScanned'))
-            valid_dates.append(date)
-        except:
-            continue
+    valid_dates = receipt_df['scan_date'].dropna()
     
-    if valid_dates:
+    if not valid_dates.empty:
         print("\nDate Range Analysis:")
-        print(f"  Earliest receipt: {min(valid_dates)}")
-        print(f"  Latest receipt: {max(valid_dates)}")
-        print(f"  Date range: {(max(valid_dates) - min(valid_dates)).days} days")
+        print(f"  Earliest receipt: {valid_dates.min()}")
+        print(f"  Latest receipt: {valid_dates.max()}")
+        print(f"  Date range: {(valid_dates.max() - valid_dates.min()).days} days")
 
 def main():
     print("Loading data...")
-    receipts = load_json_lines(RECEIPTS_FILE)
-    users = load_json_lines(USERS_FILE)
-    brands = load_json_lines(BRANDS_FILE)
+    # Read the three files concurrently; disk reads release the GIL, so one
+    # file's I/O overlaps with decoding another
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(load_json_lines, path) for path in (RECEIPTS_FILE, USERS_FILE, BRANDS_FILE)]
+        receipts, users, brands = (future.result() for future in futures)
+    
+    # Flatten receipts and users once; the analyses below work off these frames
+    receipt_df, items_df = build_receipts_frame(receipts)
+    users_df = build_users_frame(users)
     
     # Run all analyses
     profile_data_quality(receipts, "Receipts")
     profile_data_quality(users, "Users")
     profile_data_quality(brands, "Brands")
     
-    analyze_brand_codes(receipts, brands)
-    analyze_receipt_status(receipts, users)
-    analyze_data_quality(receipts, users, brands)
-    analyze_business_questions(receipts, users, brands)
+    status_summary = compute_status_summary(receipt_df, users_df)
+    
+    analyze_brand_codes(items_df, brands)
+    analyze_receipt_status(status_summary)
+    analyze_data_quality(receipt_df, items_df, users_df, brands)
+    analyze_business_questions(receipt_df, items_df, users_df, brands, status_summary)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
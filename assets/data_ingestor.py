@@ -1,296 +1,591 @@
-import json
+import csv
+import io
 import psycopg2
+import psycopg2.pool
+from psycopg2.extras import execute_values
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Sequence, Set, Tuple
 import sys
+import logging
+import logging.handlers
 from datetime import datetime
 import os
+import queue
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+from _json_io import loads, JSONDecodeError
+
+logger = logging.getLogger(__name__)
 
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 DATA_DIR = PROJECT_ROOT / 'raw_data'
 
+COPY_CHUNK_SIZE = 50000
+PAGE_SIZE = 1000
+# Receipts are loaded per batch: one round trip to reserve the batch's ids, one COPY
+RECEIPT_BATCH_SIZE = 5000
+# Session settings for every ingest connection. A crashed load is recovered by
+# re-running it, so commits need not wait for the WAL flush; wal_level is
+# server-wide and cannot be lowered from here
+SESSION_OPTIONS = "-c synchronous_commit=off -c work_mem=256MB"
+# Item chunks are COPYed concurrently over this many pooled connections
+ITEM_COPY_WORKERS = 4
+# Diagnostics are buffered and written out in blocks of this many records (errors flush at once)
+LOG_BUFFER_SIZE = 10000
+# Parsed batches the background reader may run ahead of the database work
+PREFETCH_BATCHES = 4
+
+# Secondary (non-unique) indexes; dropped during the bulk load and rebuilt
+# once afterwards. Unique constraints stay, ON CONFLICT and the foreign keys need them
+SECONDARY_INDEXES = {
+    'idx_brands_category': 'brands(category_id)',
+    'idx_receipts_user': 'receipts(userid)',
+    'idx_rewardsreceiptitemlist_receipt': 'rewardsreceiptitemlist(receipt_id)',
+    'idx_rewardsreceiptitemlist_brand': 'rewardsreceiptitemlist(brandcode)',
+}
+
+LOADED_TABLES = (
+    'categories', 'brands', 'users', 'receipts',
+    'rewardsreceiptitemlist', 'missing_brands', 'missing_users'
+)
+
+RECEIPT_COLUMNS = (
+    'receipts_id', '_id', 'bonuspointsearned', 'bonuspointsearnedreason',
+    'createdate', 'datescanned', 'finisheddate', 'modifydate',
+    'pointsawardeddate', 'pointsearned', 'purchasedate',
+    'purchaseditemcount', 'rewardsreceiptstatus',
+    'totalspent', 'userid'
+)
+
+ITEM_COLUMNS = (
+    'barcode', 'description', 'finalprice', 'itemprice',
+    'needsfetchreview', 'partneritemid', 'preventtargetgappoints',
+    'quantitypurchased', 'userflaggedbarcode', 'userflaggednewitem',
+    'userflaggedprice', 'userflaggedquantity', 'originalmetabritebarcode',
+    'originalmetabritedescription', 'pointsnotawardedreason',
+    'pointspayerid', 'rewardsgroup', 'rewardsproductpartnerid',
+    'brandcode', 'competitorrewardsgroup', 'discounteditemprice',
+    'originalreceiptitemtext', 'itemnumber', 'needsfetchreviewreason',
+    'originalmetabritequantitypurchased', 'pointsearned',
+    'targetprice', 'competitiveproduct', 'userflaggeddescription',
+    'deleted', 'priceaftercoupon', 'metabritecampaignid', 'receipt_id'
+)
+
+# Position of brandcode in a stg_items row, which leads with `ord`
+_STG_ITEM_BRANDCODE = 1 + ITEM_COLUMNS.index('brandcode')
+
+def _oid(value: Any, _dict=dict) -> Any:
+    """Unwrap a MongoDB ObjectId ({'$oid': ...}); any other value is returned unchanged"""
+    return value.get('$oid') if type(value) is _dict else value
+
+@lru_cache(maxsize=8192)
+def _ts_ms(epoch_ms: int) -> str:
+    """Convert epoch milliseconds to local timestamp text for COPY; memoized, dumps repeat the same timestamps a lot"""
+    return datetime.fromtimestamp(epoch_ms / 1000).isoformat(' ')
+
+def _ts(value: Any, _dict=dict) -> Any:
+    """Convert a MongoDB date ({'$date': epoch_ms}) to timestamp text; any other value is returned unchanged"""
+    if type(value) is _dict and '$date' in value:
+        return _ts_ms(value['$date'])
+    return value
+
+def _copy_sql(table: str, columns: Sequence[str]) -> str:
+    return f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
+
+def _csv_buffer(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    """Render rows as COPY CSV text, None becoming the NULL marker"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buf.seek(0)
+    return buf
+
+def _copy_chunk(cur, table: str, columns: Sequence[str], rows: List[Sequence[Any]]) -> List[Sequence[Any]]:
+    """COPY one chunk of rows inside the current transaction, returning the rows that were rejected.
+
+    The chunk goes in as a single COPY. If that fails, the COPY is rolled back to
+    a savepoint and the rows are retried one at a time, each under its own
+    savepoint, so a bad value costs only its own row.
+    """
+    sql = _copy_sql(table, columns)
+    cur.execute("SAVEPOINT copy_chunk")
+    try:
+        cur.copy_expert(sql, _csv_buffer(rows))
+        cur.execute("RELEASE SAVEPOINT copy_chunk")
+        return []
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT copy_chunk")
+
+    rejected = []
+    for row in rows:
+        cur.execute("SAVEPOINT copy_row")
+        try:
+            cur.copy_expert(sql, _csv_buffer((row,)))
+            cur.execute("RELEASE SAVEPOINT copy_row")
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT copy_row")
+            logger.warning("Error inserting row into %s: %s", table, str(e).strip())
+            rejected.append(row)
+    return rejected
+
+def _batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield successive lists of at most `size` items"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _prefetch(iterable: Iterable[Any], batch_size: int = PAGE_SIZE) -> Iterator[Any]:
+    """Consume `iterable` on a background thread, handing items over in batches through a bounded queue.
+
+    Parsing then overlaps with the time the main thread spends waiting on
+    Postgres. Errors raised by the producer are re-raised in the consumer, and
+    the producer stops if the consumer is closed early.
+    """
+    handoff = queue.Queue(maxsize=PREFETCH_BATCHES)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                handoff.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for batch in _batched(iterable, batch_size):
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(e)
+        put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            entry = handoff.get()
+            if entry is done:
+                return
+            if isinstance(entry, Exception):
+                raise entry
+            yield from entry
+    finally:
+        stop.set()
+
+def _iter_item_rows(receipts_with_ids: Iterable[Tuple[Dict, int]], brand_codes: Set[str],
+                    missing_brand_counts: Counter) -> Iterator[Tuple[Any, ...]]:
+    """Yield one ITEM_COLUMNS row per item of every inserted receipt, counting unknown brand codes on the way"""
+    for receipt, receipt_id in receipts_with_ids:
+        if receipt_id is None:
+            continue  # the receipt itself was rejected
+        for item in receipt.get('rewardsReceiptItemList') or ():
+            g = item.get
+            brandcode = g('brandCode')
+            if brandcode and brandcode not in brand_codes:
+                missing_brand_counts[brandcode] += 1
+
+            yield (
+                g('barcode'),
+                g('description'),
+                g('finalPrice'),
+                g('itemPrice'),
+                g('needsFetchReview'),
+                g('partnerItemId'),
+                g('preventTargetGapPoints'),
+                g('quantityPurchased'),
+                g('userFlaggedBarcode'),
+                g('userFlaggedNewItem'),
+                g('userFlaggedPrice'),
+                g('userFlaggedQuantity'),
+                g('originalMetaBriteBarcode'),
+                g('originalMetaBriteDescription'),
+                g('pointsNotAwardedReason'),
+                g('pointsPayerId'),
+                g('rewardsGroup'),
+                g('rewardsProductPartnerId'),
+                brandcode,
+                g('competitorRewardsGroup'),
+                g('discountedItemPrice'),
+                g('originalReceiptItemText'),
+                g('itemNumber'),
+                g('needsFetchReviewReason'),
+                g('originalMetaBriteQuantityPurchased'),
+                g('pointsEarned'),
+                g('targetPrice'),
+                g('competitiveProduct'),
+                g('userFlaggedDescription'),
+                g('deleted'),
+                g('priceAfterCoupon'),
+                g('metabriteCampaignId'),
+                receipt_id
+            )
+
 class DatabaseIngester:
     def __init__(self, dbname="fetchdb", user="guest", password="Password123!", host="localhost", port="5432"):
-        self.conn = psycopg2.connect(
-            dbname=dbname, user=user, password=password, host=host, port=port
+        # Kept so the items phase can open extra connections for parallel COPY
+        self.connect_kwargs = dict(
+            dbname=dbname, user=user, password=password, host=host, port=port,
+            options=SESSION_OPTIONS
         )
+        self.conn = psycopg2.connect(**self.connect_kwargs)
+        # Each phase (categories/brands, users, receipts, items) runs in one
+        # transaction and is committed once at its end
+        self.conn.autocommit = False
         self.cur = self.conn.cursor()
+        # Occurrences of unknown brand codes / user ids, upserted once per phase
+        self.missing_brand_counts = Counter()
+        self.missing_user_counts = Counter()
 
     def close(self):
         self.cur.close()
         self.conn.close()
 
-    def read_json_file(self, file_name: str) -> List[Dict]:
-        """Read JSON Lines file from raw_data directory"""
+    def _copy_rows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Sequence[Any]]:
+        """Stream rows into a table with COPY FROM STDIN, flushing every COPY_CHUNK_SIZE rows; returns the rejected rows"""
+        rejected = []
+        for chunk in _batched(rows, COPY_CHUNK_SIZE):
+            rejected.extend(_copy_chunk(self.cur, table, columns, chunk))
+        return rejected
+
+    def _copy_rows_parallel(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[Sequence[Any]]:
+        """COPY rows into a table in COPY_CHUNK_SIZE chunks spread over ITEM_COPY_WORKERS pooled connections.
+
+        Every chunk is committed on its own connection, so `table` should be a
+        staging table that the caller moves into place in its own transaction.
+        Rows are produced on the calling thread; at most two chunks per worker are
+        in flight at once. Returns the rows that were rejected.
+        """
+        pool = psycopg2.pool.ThreadedConnectionPool(1, ITEM_COPY_WORKERS, **self.connect_kwargs)
+
+        def copy_chunk(chunk: List[Sequence[Any]]) -> List[Sequence[Any]]:
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    rejected = _copy_chunk(cur, table, columns, chunk)
+                conn.commit()
+                return rejected
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn)
+
+        rejected = []
+        try:
+            with ThreadPoolExecutor(max_workers=ITEM_COPY_WORKERS) as executor:
+                in_flight = deque()
+                for chunk in _batched(rows, COPY_CHUNK_SIZE):
+                    if len(in_flight) == 2 * ITEM_COPY_WORKERS:
+                        rejected.extend(in_flight.popleft().result())
+                    in_flight.append(executor.submit(copy_chunk, chunk))
+                while in_flight:
+                    rejected.extend(in_flight.popleft().result())
+        finally:
+            pool.closeall()
+        return rejected
+
+    def _create_staging_table(self, table: str, column_defs: str):
+        """Create a temporary staging table that is dropped when the transaction ends; rows keep their input order in `ord`"""
+        self.cur.execute(f"CREATE TEMP TABLE {table} (ord INTEGER, {column_defs}) ON COMMIT DROP")
+
+    def disable_indexes(self):
+        """Drop the secondary indexes so the bulk load does not maintain them row by row"""
+        for index_name in SECONDARY_INDEXES:
+            self.cur.execute(f"DROP INDEX IF EXISTS {index_name}")
+        self.conn.commit()
+
+    def rebuild_indexes(self):
+        """Recreate the secondary indexes in one build each and refresh planner statistics"""
+        # Start from a clean transaction even if a phase was interrupted mid-way
+        self.conn.rollback()
+        try:
+            self.cur.execute("SET LOCAL maintenance_work_mem = '1GB'")
+            for index_name, target in SECONDARY_INDEXES.items():
+                self.cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+            self.conn.commit()
+            self.cur.execute(f"ANALYZE {', '.join(LOADED_TABLES)}")
+            self.conn.commit()
+        except Exception as e:
+            logger.error("Error rebuilding indexes: %s", e)
+            self.conn.rollback()
+
+    def fetch_user_ids(self) -> Set[str]:
+        """Load every user _id once so receipts can be checked in memory"""
+        self.cur.execute("SELECT _id FROM users")
+        return {row[0] for row in self.cur.fetchall()}
+
+    def fetch_brand_codes(self) -> Set[str]:
+        """Load every brandcode once so receipt items can be checked in memory"""
+        self.cur.execute("SELECT brandcode FROM brands")
+        return {row[0] for row in self.cur.fetchall()}
+
+    def iter_json_file(self, file_name: str) -> Iterator[Dict]:
+        """Stream records from a JSON Lines file in the raw_data directory, one line at a time"""
         file_path = DATA_DIR / file_name
-        data = []
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open(file_path, 'rb') as file:
                 for line in file:
-                    if line.strip():  
+                    # A bare newline is the only blank line worth testing for up front;
+                    # other whitespace-only lines are recognised on the (rare) error path
+                    if len(line) > 1:
                         try:
-                            item = json.loads(line.strip())
-                            data.append(item)
-                        except json.JSONDecodeError as e:
-                            print(f"Error parsing line in {file_name}: {str(e)}")
+                            item = loads(line)
+                        except JSONDecodeError as e:
+                            if line.strip():
+                                logger.warning("Error parsing line in %s: %s", file_name, e)
                             continue
-            return data
+                        yield item
         except Exception as e:
-            print(f"Error reading file {file_path}: {str(e)}")
-            return []
-
-    def process_timestamp(self, value: Any) -> Any:
-        """Convert MongoDB date format to PostgreSQL timestamp"""
-        if isinstance(value, dict) and '$date' in value:
-            return datetime.fromtimestamp(value['$date'] / 1000)
-        return value
+            logger.error("Error reading file %s: %s", file_path, e)
 
     def insert_brands_and_categories(self, brands_data: List[Dict]):
         """Insert brands and their categories, maintaining referential integrity"""
         categories = {brand.get('category', 'UNKNOWN'): brand.get('categoryCode', '') 
                      for brand in brands_data if brand.get('category')}
         
-        for category, categorycode in categories.items():
-            try:
-                self.cur.execute("""
-                    INSERT INTO categories (category, categorycode)
-                    VALUES (%s, %s)
-                    ON CONFLICT (category) DO UPDATE 
-                    SET categorycode = EXCLUDED.categorycode
-                    RETURNING categories_id
-                """, (category, categorycode))
-                self.conn.commit()
-            except Exception as e:
-                print(f"Error inserting category {category}: {str(e)}")
-                self.conn.rollback()
-
-        for brand in brands_data:
-            try:
-                category = brand.get('category', 'UNKNOWN')
-                self.cur.execute(
-                    "SELECT categories_id FROM categories WHERE category = %s",
-                    (category,)
-                )
-                result = self.cur.fetchone()
-                if result:
-                    category_id = result[0]
-                    self.cur.execute("""
-                        INSERT INTO brands (_id, barcode, name, topbrand, brandcode, category_id)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (brandcode) DO NOTHING
-                    """, (
-                        brand.get('_id', {}).get('$oid'),
-                        brand.get('barcode'),
-                        brand.get('name'),
-                        brand.get('topBrand', False),
-                        brand.get('brandCode'),
-                        category_id
-                    ))
-                    self.conn.commit()
-            except Exception as e:
-                print(f"Error inserting brand {brand.get('name')}: {str(e)}")
-                self.conn.rollback()
-
-    def insert_users_and_receipts(self, users_data: List[Dict], receipts_data: List[Dict]):
+        try:
+            execute_values(self.cur, """
+                INSERT INTO categories (category, categorycode)
+                VALUES %s
+                ON CONFLICT (category) DO UPDATE 
+                SET categorycode = EXCLUDED.categorycode
+            """, list(categories.items()), page_size=PAGE_SIZE)
+            self.conn.commit()
+        except Exception as e:
+            logger.error("Error inserting categories: %s", e)
+            self.conn.rollback()
+
+        # COPY all brands into staging, then resolve categories and insert in one
+        # statement; brands whose category is unknown are dropped by the join and
+        # the first brand listed for a brandcode wins
+        try:
+            self._create_staging_table("stg_brands", """
+                _id VARCHAR(24), barcode VARCHAR(255), name VARCHAR(255),
+                topbrand BOOLEAN, brandcode VARCHAR(255), category VARCHAR(255)
+            """)
+            self._copy_rows(
+                "stg_brands",
+                ('ord', '_id', 'barcode', 'name', 'topbrand', 'brandcode', 'category'),
+                ((
+                    position,
+                    _oid(brand.get('_id')),
+                    brand.get('barcode'),
+                    brand.get('name'),
+                    brand.get('topBrand', False),
+                    brand.get('brandCode'),
+                    brand.get('category', 'UNKNOWN')
+                ) for position, brand in enumerate(brands_data))
+            )
+            self.cur.execute("""
+                INSERT INTO brands (_id, barcode, name, topbrand, brandcode, category_id)
+                SELECT s._id, s.barcode, s.name, s.topbrand, s.brandcode, c.categories_id
+                FROM stg_brands s
+                JOIN categories c ON c.category = s.category
+                ORDER BY s.ord
+                ON CONFLICT (brandcode) DO NOTHING
+            """)
+            self.conn.commit()
+        except Exception as e:
+            logger.error("Error inserting brands: %s", e)
+            self.conn.rollback()
+
+    def insert_users_and_receipts(self, users_data: Iterable[Dict], receipts_data: Iterable[Dict]):
         """Insert users first, then receipts with proper foreign key handling"""
-        for user in users_data:
-            try:
-                self.cur.execute("""
-                    INSERT INTO users (_id, active, createddate, lastlogin, role, signupsource, state)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (_id) DO NOTHING
-                """, (
-                    user.get('_id', {}).get('$oid'),
+        # COPY all users into staging, then insert them in one statement; the
+        # first record for a duplicated _id wins
+        try:
+            self._create_staging_table("stg_users", """
+                _id VARCHAR(24), active BOOLEAN, createddate TIMESTAMP, lastlogin TIMESTAMP,
+                role VARCHAR(255), signupsource VARCHAR(255), state VARCHAR(255)
+            """)
+            self._copy_rows(
+                "stg_users",
+                ('ord', '_id', 'active', 'createddate', 'lastlogin', 'role', 'signupsource', 'state'),
+                ((
+                    position,
+                    _oid(user.get('_id')),
                     user.get('active'),
-                    self.process_timestamp(user.get('createdDate')),
-                    self.process_timestamp(user.get('lastLogin')),
+                    _ts(user.get('createdDate')),
+                    _ts(user.get('lastLogin')),
                     user.get('role'),
                     user.get('signUpSource'),
                     user.get('state')
-                ))
-                self.conn.commit()
-            except Exception as e:
-                print(f"Error inserting user: {str(e)}")
-                self.conn.rollback()
-
-        for receipt in receipts_data:
-            try:
-                user_id = receipt.get('userId', {}).get('$oid')
-                if not user_id:
-                    continue
-
-                self.cur.execute(
-                    "SELECT _id FROM users WHERE _id = %s",
-                    (user_id,)
-                )
-                if self.cur.fetchone():
-                    # User exists, insert receipt
-                    self.insert_receipt_without_items(receipt)
-            except Exception as e:
-                print(f"Error processing receipt: {str(e)}")
-                self.conn.rollback()
-
-    def track_missing_brand(self, brandcode: str):
-        """Track brands that exist in receipts but not in brands table"""
-        try:
+                ) for position, user in enumerate(users_data))
+            )
             self.cur.execute("""
-                INSERT INTO missing_brands (brandcode, occurrence_count)
-                VALUES (%s, 1)
-                ON CONFLICT (brandcode) 
-                DO UPDATE SET 
-                    occurrence_count = missing_brands.occurrence_count + 1,
-                    last_seen = CURRENT_TIMESTAMP
-            """, (brandcode,))
+                INSERT INTO users (_id, active, createddate, lastlogin, role, signupsource, state)
+                SELECT _id, active, createddate, lastlogin, role, signupsource, state
+                FROM stg_users
+                ORDER BY ord
+                ON CONFLICT (_id) DO NOTHING
+            """)
             self.conn.commit()
         except Exception as e:
-            print(f"Error tracking missing brand {brandcode}: {str(e)}")
+            logger.error("Error inserting users: %s", e)
             self.conn.rollback()
 
+        # Only receipts of known users are kept; one set serves both the filter
+        # and the foreign key check in insert_receipts_without_items. Skip the
+        # users round trip entirely when there are no receipts to filter
+        receipts_data = list(receipts_data)
+        if not receipts_data:
+            return
+        known_user_ids = self.fetch_user_ids()
+        receipts_with_users = [
+            receipt for receipt in receipts_data
+            if _oid(receipt.get('userId')) in known_user_ids
+        ]
+        if receipts_with_users:
+            self.insert_receipts_without_items(receipts_with_users, known_user_ids)
+
+    def track_missing_brand(self, brandcode: str):
+        """Track brands that exist in receipts but not in brands table"""
+        self.missing_brand_counts[brandcode] += 1
+
     def track_missing_user(self, user_id: str):
         """Track users that exist in receipts but not in users table"""
-        try:
-            self.cur.execute("""
-                INSERT INTO missing_users (user_id, occurrence_count)
-                VALUES (%s, 1)
-                ON CONFLICT (user_id) 
+        self.missing_user_counts[user_id] += 1
+
+    def _upsert_missing_counts(self, table: str, key_column: str, counts: Counter):
+        """Add the accumulated occurrence counts to an exception table in one batch"""
+        rows = list(counts.items())
+        counts.clear()
+        if rows:
+            execute_values(self.cur, f"""
+                INSERT INTO {table} ({key_column}, occurrence_count)
+                VALUES %s
+                ON CONFLICT ({key_column}) 
                 DO UPDATE SET 
-                    occurrence_count = missing_users.occurrence_count + 1,
+                    occurrence_count = {table}.occurrence_count + EXCLUDED.occurrence_count,
                     last_seen = CURRENT_TIMESTAMP
-            """, (user_id,))
+            """, rows, page_size=PAGE_SIZE)
+
+    def insert_receipts_without_items(self, receipts: Iterable[Dict], user_ids: Set[str]) -> Tuple[int, List[Optional[int]]]:
+        """Insert just the receipts without their items, streamed RECEIPT_BATCH_SIZE rows at a time.
+
+        Returns the number of receipts read and one receipts_id per receipt in input
+        order (None where the receipt was rejected), so a second pass over the same
+        receipts can be zipped with the ids.
+        """
+        total = 0
+        receipt_ids = []
+        try:
+            for batch in _batched(receipts, RECEIPT_BATCH_SIZE):
+                total += len(batch)
+                receipt_ids.extend(self._insert_receipt_batch(batch, user_ids))
+            if self.missing_user_counts:
+                logger.warning("Warning: %d receipts reference %d users not found - userid set to NULL",
+                               sum(self.missing_user_counts.values()), len(self.missing_user_counts))
+            self._upsert_missing_counts('missing_users', 'user_id', self.missing_user_counts)
+            
             self.conn.commit()
+            return total, receipt_ids
         except Exception as e:
-            print(f"Error tracking missing user {user_id}: {str(e)}")
+            logger.error("Error inserting receipts, none of the %d read were kept and their items are skipped: %s",
+                         total, e)
             self.conn.rollback()
-
-    def insert_receipt_without_items(self, receipt: Dict):
-        """Insert just the receipt without its items"""
+            self.missing_user_counts.clear()
+            return total, [None] * total
+
+    def _insert_receipt_batch(self, receipts: List[Dict], user_ids: Set[str]) -> List[Optional[int]]:
+        """COPY one batch of receipts straight into receipts, returning their receipts_ids in order (None if rejected).
+
+        Receipts have no conflict target, so no staging table is needed; the ids
+        are reserved from the serial sequence up front instead of being read back
+        with RETURNING (receipt _id is not unique, so joining back on it could mismatch).
+        """
+        receipt_rows = []
+        for receipt in receipts:
+            g = receipt.get
+            user_id = _oid(g('userId'))
+            if user_id and user_id not in user_ids:
+                self.track_missing_user(user_id)
+                user_id = None
+
+            receipt_rows.append((
+                _oid(g('_id')),
+                g('bonusPointsEarned'),
+                g('bonusPointsEarnedReason'),
+                _ts(g('createDate')),
+                _ts(g('dateScanned')),
+                _ts(g('finishedDate')),
+                _ts(g('modifyDate')),
+                _ts(g('pointsAwardedDate')),
+                g('pointsEarned'),
+                _ts(g('purchaseDate')),
+                g('purchasedItemCount'),
+                g('rewardsReceiptStatus'),
+                g('totalSpent'),
+                user_id
+            ))
+
+        self.cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('receipts', 'receipts_id')) FROM generate_series(1, %s)",
+            (len(receipt_rows),)
+        )
+        receipt_ids = sorted(row[0] for row in self.cur.fetchall())
+        rejected = self._copy_rows(
+            "receipts", RECEIPT_COLUMNS,
+            ((receipt_id,) + row for receipt_id, row in zip(receipt_ids, receipt_rows))
+        )
+        if rejected:
+            rejected_ids = {row[0] for row in rejected}
+            receipt_ids = [None if receipt_id in rejected_ids else receipt_id for receipt_id in receipt_ids]
+        return receipt_ids
+
+    def insert_receipt_items(self, receipts_with_ids: Iterable[Tuple[Dict, int]], brand_codes: Set[str]):
+        """Insert the items of all inserted receipts: parallel COPY into staging, then one INSERT ... SELECT"""
+        columns = ', '.join(ITEM_COLUMNS)
         try:
-            user_id = self.process_value(receipt.get('userId'))
-            if user_id:
-                self.cur.execute(
-                    "SELECT _id FROM users WHERE _id = %s",
-                    (user_id,)
-                )
-                if not self.cur.fetchone():
-                    print(f"Warning: User {user_id} not found - setting to NULL")
-                    self.track_missing_user(user_id)
-                    user_id = None
-
-            receipt_values = [
-                self.process_value(receipt.get('_id')),
-                receipt.get('bonusPointsEarned'),
-                receipt.get('bonusPointsEarnedReason'),
-                self.process_value(receipt.get('createDate')),
-                self.process_value(receipt.get('dateScanned')),
-                self.process_value(receipt.get('finishedDate')),
-                self.process_value(receipt.get('modifyDate')),
-                self.process_value(receipt.get('pointsAwardedDate')),
-                receipt.get('pointsEarned'),
-                self.process_value(receipt.get('purchaseDate')),
-                receipt.get('purchasedItemCount'),
-                receipt.get('rewardsReceiptStatus'),
-                receipt.get('totalSpent'),
-                user_id  
-            ]
+            # Staging mirrors the item columns; it is committed empty up front so
+            # the pooled connections can load it while this transaction stays open.
+            # Other sessions cannot see a temp table, so this one is UNLOGGED and
+            # dropped again together with the final insert
+            self.cur.execute(f"""
+                CREATE UNLOGGED TABLE IF NOT EXISTS stg_items AS
+                SELECT 0 AS ord, {columns} FROM rewardsreceiptitemlist WITH NO DATA
+            """)
+            self.cur.execute("TRUNCATE stg_items")
+            self.conn.commit()
 
-            self.cur.execute("""
-                INSERT INTO receipts (
-                    _id, bonuspointsearned, bonuspointsearnedreason,
-                    createdate, datescanned, finisheddate, modifydate,
-                    pointsawardeddate, pointsearned, purchasedate,
-                    purchaseditemcount, rewardsreceiptstatus,
-                    totalspent, userid
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING receipts_id
-            """, receipt_values)
-            
+            rows = _iter_item_rows(receipts_with_ids, brand_codes, self.missing_brand_counts)
+            rejected = self._copy_rows_parallel(
+                "stg_items", ('ord',) + ITEM_COLUMNS,
+                ((position,) + row for position, row in enumerate(rows))
+            )
+            # Unknown brand codes are only tallied for items that were kept
+            for row in rejected:
+                brandcode = row[_STG_ITEM_BRANDCODE]
+                count = self.missing_brand_counts.get(brandcode)
+                if count == 1:
+                    del self.missing_brand_counts[brandcode]
+                elif count:
+                    self.missing_brand_counts[brandcode] = count - 1
+            self.cur.execute(f"""
+                INSERT INTO rewardsreceiptitemlist ({columns})
+                SELECT {columns} FROM stg_items ORDER BY ord
+            """)
+            self.cur.execute("DROP TABLE stg_items")
+            if self.missing_brand_counts:
+                logger.warning("Warning: %d items reference %d brand codes not found in brands",
+                               sum(self.missing_brand_counts.values()), len(self.missing_brand_counts))
+            self._upsert_missing_counts('missing_brands', 'brandcode', self.missing_brand_counts)
             self.conn.commit()
-            return self.cur.fetchone()[0]
         except Exception as e:
-            print(f"Error inserting receipt: {str(e)}")
+            logger.error("Error inserting receipt items: %s", e)
             self.conn.rollback()
-            return None
-
-    def insert_receipt_items(self, receipt: Dict, receipt_id: int):
-        """Insert receipt items for a given receipt"""
-        for item in receipt.get('rewardsReceiptItemList', []):
-            try:
-                brandcode = item.get('brandCode')
-                if brandcode:
-                    self.cur.execute(
-                        "SELECT brandcode FROM brands WHERE brandcode = %s",
-                        (brandcode,)
-                    )
-                    if not self.cur.fetchone():
-                        self.track_missing_brand(brandcode)
-                
-                item_values = [
-                    item.get('barcode'),
-                    item.get('description'),
-                    item.get('finalPrice'),
-                    item.get('itemPrice'),
-                    item.get('needsFetchReview'),
-                    item.get('partnerItemId'),
-                    item.get('preventTargetGapPoints'),
-                    item.get('quantityPurchased'),
-                    item.get('userFlaggedBarcode'),
-                    item.get('userFlaggedNewItem'),
-                    item.get('userFlaggedPrice'),
-                    item.get('userFlaggedQuantity'),
-                    item.get('originalMetaBriteBarcode'),
-                    item.get('originalMetaBriteDescription'),
-                    item.get('pointsNotAwardedReason'),
-                    item.get('pointsPayerId'),
-                    item.get('rewardsGroup'),
-                    item.get('rewardsProductPartnerId'),
-                    brandcode,  
-                    item.get('competitorRewardsGroup'),
-                    item.get('discountedItemPrice'),
-                    item.get('originalReceiptItemText'),
-                    item.get('itemNumber'),
-                    item.get('needsFetchReviewReason'),
-                    item.get('originalMetaBriteQuantityPurchased'),
-                    item.get('pointsEarned'),
-                    item.get('targetPrice'),
-                    item.get('competitiveProduct'),
-                    item.get('userFlaggedDescription'),
-                    item.get('deleted'),
-                    item.get('priceAfterCoupon'),
-                    item.get('metabriteCampaignId'),
-                    receipt_id
-                ]
-
-                self.cur.execute("""
-                    INSERT INTO rewardsreceiptitemlist (
-                        barcode, description, finalprice, itemprice,
-                        needsfetchreview, partneritemid, preventtargetgappoints,
-                        quantitypurchased, userflaggedbarcode, userflaggednewitem,
-                        userflaggedprice, userflaggedquantity, originalmetabritebarcode,
-                        originalmetabritedescription, pointsnotawardedreason,
-                        pointspayerid, rewardsgroup, rewardsproductpartnerid,
-                        brandcode, competitorrewardsgroup, discounteditemprice,
-                        originalreceiptitemtext, itemnumber, needsfetchreviewreason,
-                        originalmetabritequantitypurchased, pointsearned,
-                        targetprice, competitiveproduct, userflaggeddescription,
-                        deleted, priceaftercoupon, metabritecampaignid, receipt_id
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                            %s, %s, %s, %s, %s, %s, %s)
-                """, item_values)
-                self.conn.commit()
-            except Exception as e:
-                print(f"Error inserting receipt item: {str(e)}")
-                self.conn.rollback()
-
-    def process_value(self, value):
-        """Handle potential null values and MongoDB objects"""
-        if isinstance(value, dict):
-            if '$date' in value:
-                return self.process_timestamp(value)
-            if '$oid' in value:
-                return value.get('$oid')
-        return value
+            self.missing_brand_counts.clear()
+            self.cur.execute("DROP TABLE IF EXISTS stg_items")
+            self.conn.commit()
 
 def main():
     if len(sys.argv) < 2:
@@ -300,26 +595,34 @@ def main():
             print(f"- {json_file.name}")
         sys.exit(1)
 
+    # Diagnostics go to stderr through a buffer instead of one write per message
+    log_handler = logging.handlers.MemoryHandler(
+        LOG_BUFFER_SIZE, flushLevel=logging.ERROR, target=logging.StreamHandler()
+    )
+    log_handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(log_handler)
+    logger.setLevel(logging.INFO)
+
     ingester = DatabaseIngester()
     
     try:
-        data_store = {}
+        # Files are streamed on demand rather than held in memory; each pass
+        # below re-reads the file it needs
+        input_files = {}
         for file_name in sys.argv[1:]:
             print(f"\nReading: {file_name}")
-            file_stem = Path(file_name).stem
-            data = ingester.read_json_file(file_name)
-            if data:
-                data_store[file_stem] = data
-
-        if 'users' in data_store and 'receipts' in data_store:
-            user_ids = set(user['_id'].get('$oid') for user in data_store['users'])
+            file_path = DATA_DIR / file_name
+            if not file_path.is_file():
+                logger.error("Error reading file %s: file not found", file_path)
+                continue
+            input_files[Path(file_name).stem] = file_name
+
+        if 'users' in input_files and 'receipts' in input_files:
+            user_ids = set(_oid(user['_id']) for user in ingester.iter_json_file(input_files['users']))
             
             receipt_user_ids = set()
-            for receipt in data_store['receipts']:
-                user_id = receipt.get('userId')
-                if isinstance(user_id, dict):
-                    user_id = user_id.get('$oid')
-                receipt_user_ids.add(user_id)
+            for receipt in ingester.iter_json_file(input_files['receipts']):
+                receipt_user_ids.add(_oid(receipt.get('userId')))
             
             missing_users = receipt_user_ids - user_ids
             
@@ -331,74 +634,83 @@ def main():
             for user_id in list(missing_users)[:5]:
                 print(f"- {user_id}")
 
-        # 1. Categories and Brands
-        if 'brands' in data_store:
-            print("\nProcessing: categories and brands")
-            ingester.insert_brands_and_categories(data_store['brands'])
-
-        # 2. Users
-        if 'users' in data_store:
-            print("\nProcessing: users")
-            ingester.insert_users_and_receipts(data_store['users'], [])
-
-        # 3. Receipts (without items first)
-        if 'receipts' in data_store:
-            print("\nProcessing: receipts")
-            total_receipts = len(data_store['receipts'])
-            skipped_receipts = 0
-            receipts_with_ids = []
-            
-            for receipt in data_store['receipts']:
-                receipt_id = ingester.insert_receipt_without_items(receipt)
-                if receipt_id:
-                    receipts_with_ids.append((receipt, receipt_id))
-                else:
-                    skipped_receipts += 1
-
-            print(f"\nReceipts summary:")
-            print(f"Total receipts: {total_receipts}")
-            print(f"Successfully inserted: {len(receipts_with_ids)}")
-            print(f"Skipped: {skipped_receipts}")
-
-        # 4. Receipt Items (only after all receipts are inserted)
-        if 'receipts' in data_store:
-            print("\nProcessing: receipt items")
-            for receipt, receipt_id in receipts_with_ids:
-                ingester.insert_receipt_items(receipt, receipt_id)
-
+        ingester.disable_indexes()
+        try:
+            # 1. Categories and Brands
+            if 'brands' in input_files:
+                print("\nProcessing: categories and brands")
+                # Brands are a small reference table and need two passes (categories first)
+                ingester.insert_brands_and_categories(list(ingester.iter_json_file(input_files['brands'])))
+
+            # 2. Users
+            if 'users' in input_files:
+                print("\nProcessing: users")
+                ingester.insert_users_and_receipts(ingester.iter_json_file(input_files['users']), [])
+
+            # 3. Receipts (without items first)
+            if 'receipts' in input_files:
+                print("\nProcessing: receipts")
+                total_receipts, receipt_ids = ingester.insert_receipts_without_items(
+                    _prefetch(ingester.iter_json_file(input_files['receipts'])), ingester.fetch_user_ids()
+                )
+                inserted_receipts = sum(receipt_id is not None for receipt_id in receipt_ids)
+                skipped_receipts = total_receipts - inserted_receipts
+
+                print(f"\nReceipts summary:")
+                print(f"Total receipts: {total_receipts}")
+                print(f"Successfully inserted: {inserted_receipts}")
+                print(f"Skipped: {skipped_receipts}")
+
+            # 4. Receipt Items (only after all receipts are inserted); a second pass
+            # over the receipts pairs each one with its receipts_id by position
+            if 'receipts' in input_files:
+                print("\nProcessing: receipt items")
+                receipts_with_ids = zip(_prefetch(ingester.iter_json_file(input_files['receipts'])), receipt_ids)
+                ingester.insert_receipt_items(receipts_with_ids, ingester.fetch_brand_codes())
+        finally:
+            ingester.rebuild_indexes()
+
+        # One round trip for the whole summary; ties broken by key so the top 5 is stable
         print("\nException Summary:")
-        ingester.cur.execute("SELECT COUNT(*) FROM missing_brands")
-        missing_brands_count = ingester.cur.fetchone()[0]
+        ingester.cur.execute("""
+            WITH top_brands AS (
+                SELECT brandcode, occurrence_count
+                FROM missing_brands
+                ORDER BY occurrence_count DESC, brandcode
+                LIMIT 5
+            ), top_users AS (
+                SELECT user_id, occurrence_count
+                FROM missing_users
+                ORDER BY occurrence_count DESC, user_id
+                LIMIT 5
+            )
+            SELECT
+                (SELECT COUNT(*) FROM missing_brands),
+                (SELECT COUNT(*) FROM missing_users),
+                (SELECT COALESCE(json_agg(json_build_array(brandcode, occurrence_count)
+                                          ORDER BY occurrence_count DESC, brandcode), '[]')
+                 FROM top_brands),
+                (SELECT COALESCE(json_agg(json_build_array(user_id, occurrence_count)
+                                          ORDER BY occurrence_count DESC, user_id), '[]')
+                 FROM top_users)
+        """)
+        missing_brands_count, missing_users_count, top_brands, top_users = ingester.cur.fetchone()
         print(f"Unique missing brands: {missing_brands_count}")
-
-        ingester.cur.execute("SELECT COUNT(*) FROM missing_users")
-        missing_users_count = ingester.cur.fetchone()[0]
         print(f"Unique missing users: {missing_users_count}")
 
         # Show top 5 most frequent missing brands
         print("\nTop 5 most frequent missing brands:")
-        ingester.cur.execute("""
-            SELECT brandcode, occurrence_count 
-            FROM missing_brands 
-            ORDER BY occurrence_count DESC 
-            LIMIT 5
-        """)
-        for brandcode, count in ingester.cur.fetchall():
+        for brandcode, count in top_brands:
             print(f"  {brandcode}: {count} occurrences")
 
         # Show top 5 most frequent missing users
         print("\nTop 5 most frequent missing users:")
-        ingester.cur.execute("""
-            SELECT user_id, occurrence_count 
-            FROM missing_users 
-            ORDER BY occurrence_count DESC 
-            LIMIT 5
-        """)
-        for user_id, count in ingester.cur.fetchall():
+        for user_id, count in top_users:
             print(f"  {user_id}: {count} occurrences")
 
     finally:
         ingester.close()
+        log_handler.close()
 
 if __name__ == "__main__":
     main()
@@ -1,56 +1,162 @@
-import json
+import io
+import contextlib
 from pathlib import Path
-from typing import Dict, List, Any, Union
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from itertools import chain, repeat
 from collections import defaultdict
+from types import MappingProxyType
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import os
+import re
+import sys
+
+from _json_io import iter_records
 
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / 'raw_data'
 
+# Shared, read-only lookup tables; every modeler instance uses the same objects
+_TYPE_MAPPING = MappingProxyType({
+    str: "VARCHAR(255)",
+    int: "INTEGER",
+    float: "DECIMAL(10,2)",
+    bool: "BOOLEAN",
+    type(None): "NULL",
+    dict: "NESTED",
+    list: "ARRAY"
+})
+
+# Exception tables structure
+_EXCEPTION_TABLES = MappingProxyType({
+    "missing_brands": MappingProxyType({
+        "columns": MappingProxyType({
+            "missing_brands_id": frozenset({"SERIAL PRIMARY KEY"}),
+            "brandcode": frozenset({"VARCHAR(255) UNIQUE"}),
+            "occurrence_count": frozenset({"INTEGER"}),
+            "first_seen": frozenset({"TIMESTAMP"}),
+            "last_seen": frozenset({"TIMESTAMP"})
+        }),
+        "relationships": frozenset({
+            ("tracks_missing", "missing_brands", "rewardsreceiptitemlist")
+        })
+    }),
+    "missing_users": MappingProxyType({
+        "columns": MappingProxyType({
+            "missing_users_id": frozenset({"SERIAL PRIMARY KEY"}),
+            "user_id": frozenset({"VARCHAR(24) UNIQUE"}),
+            "occurrence_count": frozenset({"INTEGER"}),
+            "first_seen": frozenset({"TIMESTAMP"}),
+            "last_seen": frozenset({"TIMESTAMP"})
+        }),
+        "relationships": frozenset({
+            ("tracks_missing", "missing_users", "receipts")
+        })
+    })
+})
+
+@lru_cache(maxsize=1024)
+def _clean_column_name(name: str) -> str:
+    """Clean column names to be SQL compliant; cached and interned, the key set is small and repeats every record"""
+    return sys.intern(name.replace('$', '').replace('.', '_').lower())
+
+# Column-name hints for string values; date wins over money when a name has both
+_DATE_RE = re.compile('date', re.IGNORECASE)
+_MONEY_RE = re.compile('price|spent', re.IGNORECASE)
+
+@lru_cache(maxsize=8192)
+def _infer_string_type(column_name: str, is_long: bool) -> str:
+    """Infer SQL data type for a string value from its column name.
+
+    Callers inside the modeler pass already-cleaned (lowercase) keys; the
+    patterns ignore case anyway, so raw names through infer_data_type still match.
+    """
+    if _DATE_RE.search(column_name):
+        return "TIMESTAMP"
+    if _MONEY_RE.search(column_name):
+        return "DECIMAL(10,2)"
+    return "TEXT" if is_long else "VARCHAR(255)"
+
+# Columns with special handling in _analyze, keyed by (table, column);
+# a None table applies to every table
+_SPECIAL = MappingProxyType({
+    ('receipts', 'userid'): 'fk_user',
+    ('rewardsreceiptitemlist', 'brandcode'): 'fk_brand',
+    ('brands', 'category'): 'split_category',
+    ('brands', 'categorycode'): 'skip',
+    (None, 'cpg'): 'skip',
+})
+_SPECIAL_KEYS = frozenset(column for _, column in _SPECIAL)
+
+# DDL fragments written for every column
+_COLUMN_SEPARATOR = ",\n    "
+_NULL = " NULL"
+_NOT_NULL = " NOT NULL"
+
+# Once sampling kicks in, still walk one record in this many to catch late schema drift
+_DRIFT_CHECK_INTERVAL = 1000
+
+def _describe_relationship(relationship: Tuple[str, str, str]) -> str:
+    """Render a (kind, source, target) relationship tuple as readable text"""
+    kind, source, target = relationship
+    if kind == "fk":
+        return f"foreign key relationship: {source} -> {target}"
+    if kind == "tracked_by":
+        return f"tracked by {target} when not in {source} table"
+    if kind == "one_to_many":
+        target_table, target_column = target.split('.')
+        return f"one_to_many relationship with {target_table} ({target_column})"
+    if kind == "tracks_missing":
+        return f"tracks missing from relationship with {target}"
+    return f"{kind}: {source} -> {target}"
+
+def _new_table() -> Dict:
+    return {"columns": {}, "relationships": set()}
+
+def _table(tables: Dict, table_name: str) -> Dict:
+    """Fetch a table's entry, creating it on first use"""
+    table = tables.get(table_name)
+    if table is None:
+        table = tables[table_name] = _new_table()
+    return table
+
+def _add_column(table: Dict, column: str, data_type: str) -> bool:
+    """Record one more observed data type for a column; True if it was not seen before"""
+    columns = table["columns"]
+    types = columns.get(column)
+    if types is None:
+        columns[column] = {data_type}
+        return True
+    if data_type in types:
+        return False
+    types.add(data_type)
+    return True
+
+def _add_relationship(table: Dict, relationship: Tuple[str, str, str]) -> bool:
+    """Record a relationship on a table; True if it was not seen before"""
+    relationships = table["relationships"]
+    if relationship in relationships:
+        return False
+    relationships.add(relationship)
+    return True
+
 class DataWarehouseModeler:
-    def __init__(self):
-        self.type_mapping = {
-            str: "VARCHAR(255)",
-            int: "INTEGER",
-            float: "DECIMAL(10,2)",
-            bool: "BOOLEAN",
-            type(None): "NULL",
-            dict: "NESTED",
-            list: "ARRAY"
-        }
+    # Shared lookup tables live on the class; only the per-file state is per instance
+    __slots__ = ('current_file_stem', 'exception_tables_added', 'sample_after')
+    type_mapping = _TYPE_MAPPING
+    exception_tables = _EXCEPTION_TABLES
+
+    def __init__(self, sample_after: int = 0):
         self.current_file_stem = None
-        # Add exception tables structure
-        self.exception_tables = {
-            "missing_brands": {
-                "columns": {
-                    "missing_brands_id": {"SERIAL PRIMARY KEY"},
-                    "brandcode": {"VARCHAR(255) UNIQUE"},
-                    "occurrence_count": {"INTEGER"},
-                    "first_seen": {"TIMESTAMP"},
-                    "last_seen": {"TIMESTAMP"}
-                },
-                "relationships": {
-                    "tracks missing from relationship with rewardsreceiptitemlist"
-                }
-            },
-            "missing_users": {
-                "columns": {
-                    "missing_users_id": {"SERIAL PRIMARY KEY"},
-                    "user_id": {"VARCHAR(24) UNIQUE"},
-                    "occurrence_count": {"INTEGER"},
-                    "first_seen": {"TIMESTAMP"},
-                    "last_seen": {"TIMESTAMP"}
-                },
-                "relationships": {
-                    "tracks missing from relationship with receipts"
-                }
-            }
-        }
         self.exception_tables_added = False  # Add this flag
+        # Stop walking every record once the structure has not changed for this
+        # many records in a row; 0 always scans every record. Anything first
+        # seen in a skipped record is missed, so only full scans are exact
+        self.sample_after = sample_after
         
     def clean_column_name(self, name: str) -> str:
         """Clean column names to be SQL compliant"""
-        return name.replace('$', '').replace('.', '_').lower()
+        return _clean_column_name(name)
     
     def infer_data_type(self, value: Any, column_name: str) -> str:
         """Infer SQL data type from Python value and column name"""
@@ -65,25 +171,25 @@ class DataWarehouseModeler:
                 
         value_type = type(value)
         if value_type == str:
-            if 'date' in column_name.lower():
-                return "TIMESTAMP"
-            if 'price' in column_name.lower() or 'spent' in column_name.lower():
-                return "DECIMAL(10,2)"
-            return "TEXT" if len(str(value)) > 255 else "VARCHAR(255)"
+            return _infer_string_type(column_name, len(value) > 255)
             
         return self.type_mapping.get(value_type, "VARCHAR(255)")
 
-    def analyze_structure(self, data: Union[Dict, List]) -> Dict:
-        """Recursively analyze JSON structure and suggest table designs"""
-        structure = {
-            "tables": defaultdict(lambda: {"columns": defaultdict(set), "relationships": set()})
-        }
+    def analyze_structure(self, data: Union[Dict, Iterable[Dict]]) -> Dict:
+        """Recursively analyze JSON structure and suggest table designs.
+
+        `data` is a single record or any iterable of records; records are folded
+        into the structure one at a time, so a stream never has to be held in memory.
+        """
+        structure = {"tables": {}}
         
-        if isinstance(data, list):
-            for item in data:
-                self._analyze_recursive(item, "", structure)
+        if isinstance(data, dict):
+            self._analyze(data, structure)
+        elif self.sample_after:
+            self._analyze_sampled(data, structure)
         else:
-            self._analyze_recursive(data, "", structure)
+            for item in data:
+                self._analyze(item, structure)
 
         # Add exception tables only once
         if not self.exception_tables_added:
@@ -93,140 +199,169 @@ class DataWarehouseModeler:
 
         return structure
 
-    def _analyze_recursive(self, item: Any, current_path: str, structure: Dict) -> None:
-        if isinstance(item, dict):
-            table_name = current_path.split('.')[0] if current_path else self.current_file_stem
+    def _analyze_sampled(self, records: Iterable[Dict], structure: Dict) -> None:
+        """Fold records into the structure until it stabilizes, then only sample them.
+
+        After `sample_after` consecutive records add no table, column type or
+        relationship, only every _DRIFT_CHECK_INTERVAL-th record is walked; any
+        change found that way resumes the full scan.
+        """
+        unchanged = 0
+        for position, item in enumerate(records):
+            if unchanged >= self.sample_after and position % _DRIFT_CHECK_INTERVAL:
+                continue
+            if self._analyze(item, structure):
+                unchanged = 0
+            else:
+                unchanged += 1
+
+    def _analyze(self, root: Any, structure: Dict) -> int:
+        """Fold one record into the structure; returns how many column types and relationships it added.
+
+        Nested objects are walked with an explicit stack rather than recursion, so
+        deep records cannot hit the recursion limit. Each frame holds a table name
+        and the iterator over its object's keys; a nested object is entered as soon
+        as its key comes up and the parent resumes where it left off, the same
+        order a recursive walk visits keys in.
+        """
+        if not isinstance(root, dict):
+            return 0
+        tables = structure["tables"]
+        # A new table always comes with a new column or relationship, so these
+        # two kinds of addition are enough to tell whether the record changed anything
+        changes = 0
+        stack = [(self.current_file_stem, iter(root.items()))]
+        while stack:
+            table_name, items = stack[-1]
             
-            for key, value in item.items():
-                clean_key = self.clean_column_name(key)
-                
-                # Handle relationships based on known foreign keys
-                if clean_key == 'userid' and table_name == 'receipts':
-                    data_type = "VARCHAR(24)"
-                    structure["tables"][table_name]["columns"][clean_key].add(data_type)
-                    structure["tables"][table_name]["relationships"].add(
-                        f"foreign key relationship: {table_name}.{clean_key} -> users._id")
-                    # Add relationship with missing_users table
-                    structure["tables"][table_name]["relationships"].add(
-                        f"tracked by missing_users when not in users table")
-                    continue
+            for key, value in items:
+                clean_key = _clean_column_name(key)
                 
-                # Handle brandcode relationships
-                if clean_key == 'brandcode' and table_name == 'rewardsreceiptitemlist':
-                    data_type = "VARCHAR(255)"
-                    structure["tables"][table_name]["columns"][clean_key].add(data_type)
-                    structure["tables"][table_name]["relationships"].add(
-                        f"foreign key relationship: {table_name}.{clean_key} -> brands.brandcode")
-                    # Add relationship with missing_brands table
-                    structure["tables"][table_name]["relationships"].add(
-                        f"tracked by missing_brands when not in brands table")
-                    continue
-                
-                # Handle category as separate table
-                if clean_key == 'category' and table_name == 'brands':
-                    structure["tables"]["categories"] = {
-                        "columns": {
-                            "category": {"VARCHAR(255)"},
-                            "categorycode": {"VARCHAR(255)"}
-                        },
-                        "relationships": {
-                            "one_to_many relationship with brands (category_id)"
+                # Known foreign keys and skipped columns; most keys miss the set check
+                if clean_key in _SPECIAL_KEYS:
+                    action = _SPECIAL.get((table_name, clean_key)) or _SPECIAL.get((None, clean_key))
+                    if action == 'fk_user':
+                        # Handle relationships based on known foreign keys
+                        data_type = "VARCHAR(24)"
+                        table = _table(tables, table_name)
+                        changes += _add_column(table, clean_key, data_type)
+                        changes += _add_relationship(table, ("fk", f"{table_name}.{clean_key}", "users._id"))
+                        # Add relationship with missing_users table
+                        changes += _add_relationship(table, ("tracked_by", "users", "missing_users"))
+                        continue
+                    
+                    if action == 'fk_brand':
+                        # Handle brandcode relationships
+                        data_type = "VARCHAR(255)"
+                        table = _table(tables, table_name)
+                        changes += _add_column(table, clean_key, data_type)
+                        changes += _add_relationship(table, ("fk", f"{table_name}.{clean_key}", "brands.brandcode"))
+                        # Add relationship with missing_brands table
+                        changes += _add_relationship(table, ("tracked_by", "brands", "missing_brands"))
+                        continue
+                    
+                    if action == 'split_category':
+                        # Handle category as separate table
+                        tables["categories"] = {
+                            "columns": {
+                                "category": {"VARCHAR(255)"},
+                                "categorycode": {"VARCHAR(255)"}
+                            },
+                            "relationships": {
+                                ("one_to_many", "categories", "brands.category_id")
+                            }
                         }
-                    }
-                    structure["tables"][table_name]["relationships"].add(
-                        f"foreign key relationship: {table_name}.category_id -> categories.category_id")
-                    continue
-                
-                # Skip categorycode as it's now part of categories table
-                if clean_key == 'categorycode' and table_name == 'brands':
-                    continue
-                
-                # Remove cpg handling
-                if clean_key == 'cpg':
-                    continue
+                        changes += _add_relationship(
+                            _table(tables, table_name), ("fk", f"{table_name}.category_id", "categories.category_id"))
+                        continue
+                    
+                    # Skip categorycode (part of the categories table) and cpg
+                    if action == 'skip':
+                        continue
                 
                 if isinstance(value, dict):
                     if '$date' in value or '$oid' in value:
                         data_type = self.infer_data_type(value, clean_key)
-                        structure["tables"][table_name]["columns"][clean_key].add(data_type)
+                        changes += _add_column(_table(tables, table_name), clean_key, data_type)
                     else:
                         # Skip creating cpg relationships
                         if clean_key != 'cpg':
-                            self._analyze_recursive(value, clean_key, structure)
+                            stack.append((clean_key or self.current_file_stem, iter(value.items())))
+                            break
                 elif isinstance(value, list) and value and isinstance(value[0], dict):
                     if clean_key == 'rewardsreceiptitemlist':
-                        structure["tables"][table_name]["relationships"].add(
-                            f"one_to_many relationship with rewardsreceiptitemlist (receipt_id)")
-                    self._analyze_recursive(value[0], clean_key, structure)
+                        changes += _add_relationship(
+                            _table(tables, table_name), ("one_to_many", table_name, "rewardsreceiptitemlist.receipt_id"))
+                    stack.append((clean_key or self.current_file_stem, iter(value[0].items())))
+                    break
                 else:
                     data_type = self.infer_data_type(value, clean_key)
-                    structure["tables"][table_name]["columns"][clean_key].add(data_type)
+                    changes += _add_column(_table(tables, table_name), clean_key, data_type)
+            else:
+                # Every key of this object is done
+                stack.pop()
+
+        return changes
 
     def generate_ddl(self, structure: Dict) -> str:
         """Generate DDL statements from analyzed structure"""
-        ddl = []
+        buf = io.StringIO()
+        write = buf.write
+        separator = ""
         
         # Create tables, including exception tables
         for table_name, table_info in structure["tables"].items():
-            columns = []
+            write(separator)
+            separator = "\n\n"
+            write(f"CREATE TABLE {table_name} (\n    ")
             
             # Handle primary key
             if table_name in self.exception_tables:
                 # Use predefined columns for exception tables
-                columns = [f"{col} {' '.join(types)}" 
-                          for col, types in table_info["columns"].items()]
+                column_separator = ""
+                for col, types in table_info["columns"].items():
+                    write(column_separator)
+                    column_separator = _COLUMN_SEPARATOR
+                    write(col)
+                    write(" ")
+                    write(" ".join(types))
             else:
                 # Regular table handling
-                columns.append(f"{table_name}_id SERIAL PRIMARY KEY")
+                write(f"{table_name}_id SERIAL PRIMARY KEY")
                 for col_name, data_types in table_info["columns"].items():
-                    data_type = max(data_types, key=lambda x: 0 if x == "NULL" else 1)
-                    nullable = "NULL" in data_types
-                    columns.append(f"{col_name} {data_type}" + 
-                                 (" NULL" if nullable else " NOT NULL"))
+                    # First non-NULL type seen; a column that was only ever null falls back to VARCHAR
+                    data_type = next((t for t in data_types if t != "NULL"), "VARCHAR(255)")
+                    write(_COLUMN_SEPARATOR)
+                    write(col_name)
+                    write(" ")
+                    write(data_type)
+                    write(_NULL if "NULL" in data_types else _NOT_NULL)
             
-            create_table = f"CREATE TABLE {table_name} (\n"
-            create_table += "    " + ",\n    ".join(columns)
-            create_table += "\n);"
-            ddl.append(create_table)
+            write("\n);")
             
             # Add indexes for exception tables
             if table_name == 'missing_brands':
-                ddl.append(f"CREATE INDEX idx_{table_name}_brandcode ON {table_name}(brandcode);")
+                write(f"\n\nCREATE INDEX idx_{table_name}_brandcode ON {table_name}(brandcode);")
             elif table_name == 'missing_users':
-                ddl.append(f"CREATE INDEX idx_{table_name}_user_id ON {table_name}(user_id);")
+                write(f"\n\nCREATE INDEX idx_{table_name}_user_id ON {table_name}(user_id);")
         
-        return "\n\n".join(ddl)
+        return buf.getvalue()
 
-def read_json_file(file_path: Path) -> List[Dict]:
-    data = []
+def read_json_file(file_path: Path) -> Iterator[Dict]:
+    """Yield the records of a JSON or JSON Lines file; JSON Lines records are streamed one line at a time"""
     try:
-        # First try reading as regular JSON
-        with open(file_path, 'r', encoding='utf-8') as file:
-            try:
-                content = json.load(file)
-                if isinstance(content, list):
-                    data.extend(content)
-                else:
-                    data.append(content)
-            except json.JSONDecodeError:
-                # If that fails, try reading as JSONL
-                file.seek(0)
-                for line in file:
-                    if line.strip():
-                        try:
-                            item = json.loads(line.strip())
-                            data.append(item)
-                        except json.JSONDecodeError:
-                            continue
+        yield from iter_records(file_path)
     except Exception as e:
         print(f"Error reading file: {str(e)}")
         print(f"File path attempted: {file_path}")
         print(f"Current working directory: {os.getcwd()}")
-        return []
-    
-    return data
 
-def analyze_json_file(file_path: str) -> None:
+def _peek(records: Iterator[Dict]) -> Union[Iterator[Dict], None]:
+    """Return the stream unchanged (first record included), or None if it is empty"""
+    first = next(records, None)
+    return None if first is None else chain([first], records)
+
+def analyze_json_file(file_path: str, sample_after: int = 0) -> None:
     try:
         # Handle path resolution
         file_path = DATA_DIR / file_path
@@ -235,12 +370,12 @@ def analyze_json_file(file_path: str) -> None:
         # Get the file name without extension to use as default table name
         file_stem = file_path.stem
 
-        data = read_json_file(file_path)
-        if not data:
+        data = _peek(read_json_file(file_path))
+        if data is None:
             print("No valid JSON data found in file")
             return
 
-        modeler = DataWarehouseModeler()
+        modeler = DataWarehouseModeler(sample_after)
         modeler.current_file_stem = file_stem  # Set the current file stem
         structure = modeler.analyze_structure(data)
         
@@ -255,8 +390,8 @@ def analyze_json_file(file_path: str) -> None:
             
             if table_info["relationships"]:
                 print("Relationships:")
-                for rel in table_info["relationships"]:
-                    print(f"  - {rel}")
+                for rel in sorted(table_info["relationships"]):
+                    print(f"  - {_describe_relationship(rel)}")
                     
         return structure
 
@@ -264,56 +399,95 @@ def analyze_json_file(file_path: str) -> None:
         print(f"Error analyzing {file_path}: {str(e)}")
         return None
 
+def _freeze_structure(structure: Dict) -> Dict:
+    """Copy a structure into plain dicts and sets so it can be pickled back from a worker process"""
+    return {
+        "tables": {
+            table_name: {
+                "columns": {col: set(types) for col, types in table_info["columns"].items()},
+                "relationships": set(table_info["relationships"])
+            }
+            for table_name, table_info in structure["tables"].items()
+        }
+    }
+
+def _analyze_one(file_path: str, sample_after: int = 0) -> Tuple[str, Optional[Dict], str]:
+    """Analyze one input file in a worker process; returns (file_stem, structure, printed messages).
+
+    Whatever the analysis prints (read errors included) is captured and handed
+    back, so the parent can print it under the file's own header.
+    """
+    file_stem = Path(file_path).stem
+    structure = None
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            data = _peek(read_json_file(DATA_DIR / file_path))
+            if data is None:
+                print(f"No valid JSON data found in {file_path}")
+            else:
+                modeler = DataWarehouseModeler(sample_after)
+                modeler.current_file_stem = file_stem
+                structure = _freeze_structure(modeler.analyze_structure(data))
+        except Exception as e:
+            print(f"Error analyzing {file_path}: {str(e)}")
+    return file_stem, structure, output.getvalue()
+
 if __name__ == "__main__":
-    import sys
-    from pathlib import Path
-    
-    if len(sys.argv) < 2:
-        print("Usage: python dw_modeler.py <json_file1> [json_file2] [json_file3] ...")
+    # --sample N: stop walking every record once a file's structure has been
+    # stable for N records (0, the default, scans every record). Sampling is
+    # lossy: columns or types that first appear in skipped records are missed
+    args = sys.argv[1:]
+    sample_after = 0
+    bad_sample = False
+    if args[:1] == ["--sample"]:
+        try:
+            sample_after = int(args[1])
+        except (IndexError, ValueError):
+            bad_sample = True
+        bad_sample = bad_sample or sample_after < 0
+        args = args[2:]
+
+    if bad_sample or not args:
+        if bad_sample:
+            print("--sample needs a non-negative integer (0 scans every record)")
+        print("Usage: python dw_modeler.py [--sample N] <json_file1> [json_file2] [json_file3] ...")
+        print("  --sample N  only sample records once the structure is unchanged for N records;")
+        print("              faster, but can miss columns or types that first appear later")
         print("\nAvailable JSON files:")
         for json_file in DATA_DIR.glob('*.json'):
             print(f"- {json_file.name}")
         sys.exit(1)
     
-    # Process all input files
+    # Process all input files; each file is independent, so they are analyzed
+    # in parallel worker processes and reported back in argument order
     all_structures = {}
+    file_paths = args
     
-    for file_path in sys.argv[1:]:
-        try:
-            # Handle path resolution
-            json_path = DATA_DIR / file_path
-            print(f"\nAnalyzing: {json_path}")
-            
-            data = read_json_file(json_path)
-            if not data:
-                print(f"No valid JSON data found in {file_path}")
+    with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1)) as executor:
+        results = executor.map(_analyze_one, file_paths, repeat(sample_after))
+        for file_path, (file_stem, structure, messages) in zip(file_paths, results):
+            print(f"\nAnalyzing: {DATA_DIR / file_path}")
+            print(messages, end='')
+            if structure is None:
                 continue
-                
-            modeler = DataWarehouseModeler()
-            file_stem = Path(file_path).stem  # Convert string to Path object to get stem
-            modeler.current_file_stem = file_stem
-            structure = modeler.analyze_structure(data)
-            
             all_structures[file_stem] = structure
-            
-        except Exception as e:
-            print(f"Error analyzing {file_path}: {str(e)}")
     
-    # Analyze potential relationships between tables
+    # Analyze potential relationships between tables: index the files by
+    # lowercased name once, then resolve each candidate key column with a lookup
+    stems_by_name = defaultdict(list)
+    for file_stem in all_structures:
+        stems_by_name[file_stem.lower()].append(file_stem)
+    
     relationships = []
     for table1, struct1 in all_structures.items():
-        for table2, struct2 in all_structures.items():
-            if table1 != table2:
-                # Look for matching column names that could indicate relationships
-                cols1 = set(next(iter(struct1["tables"].values()))["columns"].keys())
-                cols2 = set(next(iter(struct2["tables"].values()))["columns"].keys())
-                
-                # Find potential foreign keys
-                for col in cols1:
-                    if col.endswith('_id') or col.endswith('Id'):
-                        base_name = col.replace('_id', '').replace('Id', '').lower()
-                        if base_name == table2.lower():
-                            relationships.append(f"Potential foreign key: {table1}.{col} -> {table2}")
+        # Candidate foreign keys are the *_id / *Id columns of the file's main table
+        for col in next(iter(struct1["tables"].values()))["columns"]:
+            if col.endswith(('_id', 'Id')):
+                base_name = col.replace('_id', '').replace('Id', '').lower()
+                for table2 in stems_by_name.get(base_name, ()):
+                    if table2 != table1:
+                        relationships.append(f"Potential foreign key: {table1}.{col} -> {table2}")
     
     # Print combined analysis
     print("\n=== Combined Data Warehouse Structure ===\n")
@@ -328,8 +502,8 @@ if __name__ == "__main__":
             
             if table_info["relationships"]:
                 print("Internal Relationships:")
-                for rel in table_info["relationships"]:
-                    print(f"  - {rel}")
+                for rel in sorted(table_info["relationships"]):
+                    print(f"  - {_describe_relationship(rel)}")
     
     if relationships:
         print("\nPotential Cross-File Relationships:")
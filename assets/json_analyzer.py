@@ -1,89 +1,97 @@
-import json
-import pandas as pd
-from typing import Dict, Set, List, Any, Tuple, Union
+import sys
+from typing import Dict, Set, List, Any, Iterable, Tuple, Union
 
-def analyze_json_file(file_path: str) -> Dict[str, Any]:
+from _json_io import iter_records, JSONDecodeError
+
+def analyze_json_file(file_path: str, verbose: bool = False) -> Dict[str, Any]:
     """
     Analyze a JSON file and return statistics about its structure.
     
     Args:
         file_path: Path to the JSON file to analyze
+        verbose: Print the key depth table as a pandas DataFrame (imports pandas)
         
     Returns:
         Dictionary containing analysis results or error information
     """
-    with open(file_path, 'r', encoding='utf-8') as file:
-        try:
-            data = json.load(file)
-        except json.JSONDecodeError:
-            file.seek(0)  
-            try:
-                data = [json.loads(line) for line in file if line.strip()]
-            except json.JSONDecodeError as e:
-                return {"status": "error", "message": f"Failed to parse as JSON or JSON Lines: {str(e)}"}
-            except Exception as e:
-                return {"status": "error", "message": f"Unexpected error: {str(e)}"}
-
-    if data:
-        def analyze_json(
-            data: Union[Dict, List, Any], 
-            level: int = 0, 
-            key_stats: Dict[str, Union[Set[str], Dict[str, List[int]], List[Tuple[Any, int]]]] = None
-        ) -> Dict[str, Union[Set[str], Dict[str, List[int]], List[Tuple[Any, int]]]]:
-            """
-            Recursively analyze JSON data structure to gather statistics about keys and their depths.
+    def analyze_json(
+        records: Iterable[Any]
+    ) -> Dict[str, Union[int, Set[str], Dict[str, Set[int]], List[Tuple[Any, int]]]]:
+        """
+        Walk JSON records to gather statistics about keys and their depths.
+        
+        Records are consumed one at a time as they stream in. Each is walked
+        with an explicit stack rather than recursion; entries are pushed in
+        reverse so they are visited in the same order a recursive walk would.
+        
+        Args:
+            records: The top-level JSON records to analyze
             
-            Args:
-                data: The JSON data to analyze
-                level: Current depth level in the JSON structure
-                key_stats: Dictionary to store analysis results
-                
-            Returns:
-                Dictionary containing analysis results
-            """
-            if key_stats is None:
-                key_stats = {"total_keys": set(), "key_depths": {}, "abnormalities": []}
+        Returns:
+            Dictionary containing analysis results
+        """
+        key_stats = {"records": 0, "total_keys": set(), "key_depths": {}, "abnormalities": []}
+        total_keys = key_stats["total_keys"]
+        key_depths = key_stats["key_depths"]
+
+        for record in records:
+            key_stats["records"] += 1
+            # (key, value, level of the dict holding the key); key is None for the
+            # root and list items, which sit at their container's level
+            stack = [(None, record, 0)]
+            while stack:
+                key, node, level = stack.pop()
+                if key is not None:
+                    total_keys.add(key)
+                    depths = key_depths.get(key)
+                    if depths is None:
+                        depths = key_depths[key] = set()
+                    depths.add(level)
+                    level += 1
 
-            if isinstance(data, dict):
-                for key, value in data.items():
-                    key_stats["total_keys"].add(key)
-                    if key not in key_stats["key_depths"]:
-                        key_stats["key_depths"][key] = []
-                    key_stats["key_depths"][key].append(level)
-                    analyze_json(value, level + 1, key_stats)
-            elif isinstance(data, list):
-                for item in data:
-                    analyze_json(item, level, key_stats)
-            else:
-                if not isinstance(data, (str, int, float, bool, type(None))):
-                    key_stats["abnormalities"].append((data, level))
+                if isinstance(node, dict):
+                    stack.extend((k, v, level) for k, v in reversed(node.items()))
+                elif isinstance(node, list):
+                    stack.extend((None, item, level) for item in reversed(node))
+                elif not isinstance(node, (str, int, float, bool, type(None))):
+                    key_stats["abnormalities"].append((node, level))
 
-            return key_stats
+        return key_stats
 
-        stats = analyze_json(data)
+    try:
+        stats = analyze_json(iter_records(file_path, skip_invalid=False))
+    except JSONDecodeError as e:
+        return {"status": "error", "message": f"Failed to parse as JSON or JSON Lines: {str(e)}"}
+    except Exception as e:
+        return {"status": "error", "message": f"Unexpected error: {str(e)}"}
 
-        # Prepare stats summary
-        stats_summary = {
-            "status": "success",
-            "total_unique_keys": len(stats["total_keys"]),
-            "keys_and_their_depths": {k: sorted(list(set(v))) for k, v in stats["key_depths"].items()},
-            "abnormal_data_points": stats["abnormalities"]
-        }
+    if not stats["records"]:
+        return {"status": "error", "message": "No JSON data found"}
 
-        # Prepare a DataFrame for visualization of key depth analysis
+    # Prepare stats summary
+    stats_summary = {
+        "status": "success",
+        "total_unique_keys": len(stats["total_keys"]),
+        "keys_and_their_depths": {k: sorted(v) for k, v in stats["key_depths"].items()},
+        "abnormal_data_points": stats["abnormalities"]
+    }
+
+    print("\nJSON Key Depth Analysis:")
+    if verbose:
+        # pandas is only needed for this table, so it is imported on demand
+        import pandas as pd
         depth_analysis = pd.DataFrame([
-            {"key": key, "depths": sorted(list(depths))}
+            {"key": key, "depths": depths}
             for key, depths in stats_summary["keys_and_their_depths"].items()
         ])
-        
-        print("\nJSON Key Depth Analysis:")
-        print(depth_analysis) 
-
-        return stats_summary
+        print(depth_analysis)
     else:
-        return {"status": "error", "message": error_message}
+        for key, depths in stats_summary["keys_and_their_depths"].items():
+            print(f"  {key}: {depths}")
+
+    return stats_summary
 
 if __name__ == "__main__":
     file_path = '../raw_data/receipts.json'
-    result = analyze_json_file(file_path)
+    result = analyze_json_file(file_path, verbose='--verbose' in sys.argv[1:])
     print(result)
\ No newline at end of file